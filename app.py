@@ -1,23 +1,57 @@
 import json
-from flask import Flask, request, jsonify
+import os
+import time
+import hashlib
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from ticket_service.utils.db import *
 from ticket_service.services.process_payment import *
-from ticket_service.services.generate_code_service import generate_code
-import requests
+from ticket_service.services.issue_ticket_service import issue_tickets, process_payment_notification, is_payment_processed
+from ticket_service.services.gate_index_service import build_code_index
+from ticket_service.services.generate_code_service import is_valid_code
+from ticket_service.services.generate_qrcode_service import FORMATS as QR_FORMATS, render_qr_code, stream_qr_zip, stream_qr_pdf
+from ticket_service.services.webhook_queue import init_webhook_queue, enqueue_payment, start_webhook_workers
 from auth_service.services.cognito_service import *
-import jwt
-from news_service.db import init_news_db, add_news, get_all_news
-from decimal import Decimal
+from news_service.db import init_news_db, add_news, search_news, NEWS_PAGE_SIZE, NEWS_MAX_PAGE_SIZE, NEWS_SEARCH_MAX_OFFSET
+from news_service.feed import get_news_feed, invalidate_news_feed, news_item
+from news_service.images import NEWS_IMAGES_BACKEND, NEWS_IMAGES_DIR, ingest_news_image
+from datetime import datetime, timedelta, timezone
+from ticket_service.utils.inventory import (
+    RESERVATION_TTL, resolve_lot_id, reserve_lot, confirm_reservation, release_reservation,
+    enable_lot_sharding, start_reservation_sweeper
+)
 cognito_service = CognitoService()
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Next-Before'])
   # Habilita CORS para permitir requisições de outros domínios
 
-ensure_table_exists()
+# Os processos de renderização de QR Codes (iniciados com "spawn") importam este
+# módulo como __mp_main__ e não devem abrir as filas nem iniciar as threads do servidor.
+# As threads também são iniciadas na primeira requisição de cada processo (ver
+# start_background_workers), pois workers criados por fork não herdam as threads.
+# As tabelas do DynamoDB são criadas por `python manage.py provision`, fora do boot.
+if __name__ != '__mp_main__':
+    init_news_db()
+
+    # Os workers da fila só acessam o DynamoDB quando há notificações a processar
+    init_webhook_queue()
+    start_webhook_workers(process_payment_notification)
+
+@app.before_request
+def start_background_workers():
+    # Sem efeito quando as threads já rodam neste processo (a checagem é pelo pid)
+    start_webhook_workers(process_payment_notification)
+
+@app.before_request
+def check_tables():
+    # Confere as tabelas do DynamoDB uma única vez por processo (ver DYNAMODB_TABLE_CHECK).
+    # As notícias (e suas imagens) não usam o DynamoDB, então essas rotas não carregam o boto3
+    # nem iniciam a limpeza periódica das reservas, que consulta o DynamoDB.
+    if not request.path.startswith(('/news', '/media')):
+        check_tables_once()
+        start_reservation_sweeper()
 
-init_news_db()
 @app.route('/news/create', methods=['POST'])
 def create_news():
     data = request.json
@@ -30,21 +64,74 @@ def create_news():
         return jsonify({"error": "Todos os campos são obrigatórios."}), 400
 
     try:
-        news_id = add_news(image, title, subtitle, date)
+        # Data URIs do CMS viram arquivos redimensionados; a tabela guarda só as URLs
+        image, image_variants = ingest_news_image(image)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        # Falha ao gravar os arquivos (S3 ou disco)
+        return jsonify({"error": str(e)}), 500
+
+    try:
+        news_id = add_news(image, title, subtitle, date, image_variants)
+        invalidate_news_feed()
         return jsonify({"message": "Notícia adicionada com sucesso!", "news_id": news_id}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route('/media/<path:key>', methods=['GET'])
+def news_media(key):
+    # Imagens das notícias no armazenamento local; as chaves mudam com o conteúdo
+    if NEWS_IMAGES_BACKEND != 'local':
+        return jsonify({"error": "Não encontrado"}), 404
+    response = send_from_directory(os.path.abspath(NEWS_IMAGES_DIR), key, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/news', methods=['GET'])
 def get_all_news_route():
-    news = get_all_news()
-    return jsonify([{
-        'id': n[0],
-        'image': n[1],
-        'title': n[2],
-        'subtitle': n[3],
-        'date': n[4]
-    } for n in news]), 200
+    # Paginação por chave: ?limit=20&before=<id da última notícia recebida>.
+    # O before da próxima página vem no cabeçalho X-Next-Before.
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', NEWS_PAGE_SIZE, type=int), 1), NEWS_MAX_PAGE_SIZE)
+
+    try:
+        feed = get_news_feed(before, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Corpo já serializado e comprimido em memória; muda apenas quando as notícias mudam
+    encoding = next((name for name in ('br', 'gzip') if name in feed and request.accept_encodings[name]), 'identity')
+    body, etag = feed[encoding]
+    response = Response(body, mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    if feed['next_before'] is not None:
+        response.headers['X-Next-Before'] = str(feed['next_before'])
+    return response.make_conditional(request)
+
+@app.route('/news/search', methods=['GET'])
+def search_news_route():
+    # Busca textual: ?q=<texto>&limit=20&offset=0, ordenada por relevância
+    text = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', NEWS_PAGE_SIZE, type=int), 1), NEWS_MAX_PAGE_SIZE)
+    offset = request.args.get('offset', 0, type=int)
+
+    if not text or len(text) > 200:
+        return jsonify({"error": "Informe o texto da busca (até 200 caracteres)."}), 400
+    if not 0 <= offset <= NEWS_SEARCH_MAX_OFFSET:
+        return jsonify({"error": f"offset deve estar entre 0 e {NEWS_SEARCH_MAX_OFFSET}"}), 400
+
+    # Uma linha a mais indica se existe próxima página
+    rows = search_news(text, limit + 1, offset)
+    results = [dict(news_item(row), snippet=row[-1]) for row in rows[:limit]]
+    return jsonify({
+        'results': results,
+        'next_offset': offset + limit if len(rows) > limit else None
+    }), 200
 
 @app.route('/generate_ticket', methods=['POST'])
 def generate_ticket():
@@ -61,17 +148,11 @@ def generate_ticket():
     if not all([event_id, name, email, cpf, user_id, lot]) or price is None:
         return jsonify({'error': 'Dados incompletos'}), 400
 
-    tickets = []
-    for _ in range(quantity):
-        code = generate_code()
-        if store_ticket(event_id, code, name, email, cpf, user_id, Decimal(str(price)), lot):
-            tickets.append({'code': code})
-            # Atualiza o saldo do administrador
-            update_admin_balance('7b87fd15-bea4-4fff-9033-9224fc0c8a01', price)  # Substitua 'admin_id' pelo ID real do administrador
-        else:
-            return jsonify({'error': 'Código já existente'}), 409
+    result = issue_tickets(event_id, name, email, cpf, user_id, quantity, price, lot)
+    if not result["success"]:
+        return jsonify({'error': result["error"]}), 409
 
-    return jsonify({'tickets': tickets}), 201
+    return jsonify({'tickets': result["tickets"]}), 201
 
 
 @app.route('/tickets/<event_id>/<code>', methods=['GET'])
@@ -82,10 +163,53 @@ def read_ticket(event_id, code):
     else:
         return jsonify({'error': 'Ingresso não encontrado'}), 404
 
+# Quantidade de tickets serializados por bloco nas respostas em streaming
+STREAM_CHUNK_SIZE = 500
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_VALIDATION = 1000
+MAX_QR_EXPORT = 5000
+
+def _serialized_chunks(items):
+    chunk = []
+    for item in items:
+        chunk.append(app.json.dumps(item))
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _stream_ndjson(items):
+    for chunk in _serialized_chunks(items):
+        yield '\n'.join(chunk) + '\n'
+
+def _stream_json_array(items):
+    yield '['
+    for i, chunk in enumerate(_serialized_chunks(items)):
+        yield (',' if i else '') + ','.join(chunk)
+    yield ']'
+
 @app.route('/tickets/<event_id>', methods=['GET'])
 def read_all_tickets(event_id):
-    tickets = get_all_tickets(event_id)
-    return jsonify(tickets), 200
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+
+    if 'limit' in request.args and (limit is None or limit < 1):
+        return jsonify({'error': 'limit deve ser um inteiro maior que zero'}), 400
+
+    # Paginação por cursor: ?limit=100&cursor=<next_cursor>
+    if limit or cursor:
+        try:
+            tickets, next_cursor = get_tickets_page(event_id, min(limit or 100, MAX_PAGE_SIZE), cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'tickets': tickets, 'next_cursor': next_cursor}), 200
+
+    # Exportação completa em streaming, com memória constante
+    tickets = iter_all_tickets(event_id)
+    if request.args.get('format') == 'ndjson':
+        return Response(_stream_ndjson(tickets), mimetype='application/x-ndjson'), 200
+    return Response(_stream_json_array(tickets), mimetype='application/json'), 200
 
 @app.route('/tickets/<event_id>/<code>', methods=['PUT'])
 def update_ticket_route(event_id, code):
@@ -108,12 +232,128 @@ def delete_ticket_route(event_id, code):
     
 @app.route('/tickets/<event_id>/<code>/validate', methods=['POST'])
 def validate_ticket(event_id, code):
-    if move_ticket_to_validated(event_id, code):
+    # Códigos com dígito verificador errado são recusados sem consultar o DynamoDB
+    try:
+        validated = is_valid_code(code) and move_ticket_to_validated(event_id, code)
+    except Exception as e:
+        # Conflito persistente ou falha do DynamoDB: o leitor deve tentar de novo
+        return jsonify({'error': f'Erro ao validar ingresso, tente novamente: {e}'}), 503
+    if validated:
         return jsonify({'message': 'Ingresso validado e movido para a tabela de validados'}), 200
     else:
         return jsonify({'error': 'Ingresso não encontrado'}), 404
     
 
+def _validate_codes(event_id, codes):
+    # Códigos com dígito verificador errado ficam como 'unknown' sem consultar o DynamoDB
+    plausible = [code for code in codes if is_valid_code(code)]
+    results = validate_tickets_batch(event_id, plausible) if plausible else {}
+    return {code: results.get(code, 'unknown') for code in codes}
+
+@app.route('/tickets/<event_id>/validate_batch', methods=['POST'])
+def validate_ticket_batch(event_id):
+    data = request.json or {}
+    codes = data.get('codes')
+
+    if not isinstance(codes, list) or not codes or not all(isinstance(code, str) for code in codes):
+        return jsonify({'error': 'Lista de códigos é obrigatória'}), 400
+    if len(codes) > MAX_BATCH_VALIDATION:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_VALIDATION} códigos por requisição'}), 400
+
+    results = _validate_codes(event_id, codes)
+    return jsonify({'results': [{'code': code, 'status': results[code]} for code in codes]}), 200
+
+@app.route('/tickets/<event_id>/index', methods=['GET'])
+def export_code_index(event_id):
+    # Índice ordenado de largura fixa para validação offline nos portões (ver gate_index_service)
+    codes = (ticket['code'] for ticket in iter_all_tickets(event_id, attributes=['code']))
+    response = Response(build_code_index(codes), mimetype='application/octet-stream')
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/tickets/<event_id>/sync', methods=['POST'])
+def sync_validations(event_id):
+    """
+    Sincronização incremental dos leitores offline.
+
+    Recebe {"codes": [...], "since": <timestamp da última sincronização>} e devolve o
+    resultado de cada validação enviada, os códigos validados por outros portões desde
+    `since` e o horário do servidor para a próxima sincronização.
+    """
+    data = request.json or {}
+    codes = data.get('codes', [])
+    since = data.get('since', 0)
+
+    if (not isinstance(codes, list) or not all(isinstance(code, str) for code in codes)
+            or not isinstance(since, (int, float)) or isinstance(since, bool)):
+        return jsonify({'error': 'Dados inválidos'}), 400
+
+    if len(codes) > MAX_BATCH_VALIDATION:
+        return jsonify({'error': f'Máximo de {MAX_BATCH_VALIDATION} códigos por sincronização'}), 400
+
+    server_time = int(time.time())
+    results = _validate_codes(event_id, codes)
+    return jsonify({
+        'results': results,
+        'validated_since': get_validated_codes_since(event_id, since),
+        'server_time': server_time
+    }), 200
+
+@app.route('/qr/<code>.<fmt>', methods=['GET'])
+def qr_code_image(code, fmt):
+    box_size = request.args.get('box_size', 10, type=int)
+    border = request.args.get('border', 4, type=int)
+
+    if fmt not in QR_FORMATS:
+        return jsonify({'error': 'Formato deve ser png ou svg'}), 400
+    if not code.isalnum() or len(code) > 64 or not 1 <= box_size <= 40 or not 0 <= border <= 10:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+
+    image = render_qr_code(code, fmt, box_size, border)
+    response = Response(image, mimetype=QR_FORMATS[fmt])
+    # A imagem depende apenas do código e do estilo, então pode ficar em cache indefinidamente
+    response.set_etag(hashlib.sha256(image).hexdigest())
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+def _qr_export_response(codes, export_format, filename):
+    # ZIP com uma imagem por ingresso (PNG ou SVG) ou PDF com os QR Codes em grade, gerados em paralelo
+    if export_format == 'pdf':
+        body, mimetype, extension = stream_qr_pdf(codes), 'application/pdf', 'pdf'
+    else:
+        fmt = 'svg' if export_format == 'zip-svg' else 'png'
+        body, mimetype, extension = stream_qr_zip(codes, fmt), 'application/zip', 'zip'
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+@app.route('/tickets/<event_id>/qr_export', methods=['GET'])
+def export_event_qr_codes(event_id):
+    # ?format=zip (PNG), zip-svg ou pdf
+    export_format = request.args.get('format', 'zip')
+    if export_format not in ('zip', 'zip-svg', 'pdf'):
+        return jsonify({'error': 'Formato deve ser zip, zip-svg ou pdf'}), 400
+
+    codes = [ticket['code'] for ticket in iter_all_tickets(event_id, attributes=['code'])]
+    return _qr_export_response(codes, export_format, f'qrcodes-{event_id}')
+
+@app.route('/qr/export', methods=['POST'])
+def export_qr_codes():
+    # QR Codes de um pedido grande: {"codes": [...], "format": "zip" | "zip-svg" | "pdf"}
+    data = request.json or {}
+    codes = data.get('codes')
+    export_format = data.get('format', 'zip')
+
+    if not isinstance(codes, list) or not codes or not all(isinstance(code, str) and code.isalnum() for code in codes):
+        return jsonify({'error': 'Lista de códigos é obrigatória'}), 400
+    if len(codes) > MAX_QR_EXPORT:
+        return jsonify({'error': f'Máximo de {MAX_QR_EXPORT} códigos por requisição'}), 400
+    if export_format not in ('zip', 'zip-svg', 'pdf'):
+        return jsonify({'error': 'Formato deve ser zip, zip-svg ou pdf'}), 400
+
+    return _qr_export_response(codes, export_format, 'qrcodes')
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     # Verifica se a requisição é JSON
@@ -130,72 +370,16 @@ def webhook():
     # Obtém o ID do pagamento
     payment_id = data['data']['id']
 
-    try:
-        # Busca os detalhes do pagamento usando o SDK do Mercado Pago
-        payment_details = get_payment_details(payment_id)
-        print(type(payment_details))  # ADICIONE ESTE PRINT
-        print("Detalhes do pagamento:", payment_details)  # Log para debug
-
-        external_reference = payment_details.get("external_reference")
-        print(f'external_reference: {external_reference}')  # ADICIONE ESTE PRINT
-        if not external_reference:
-            return jsonify({"success": False, "error": "external_reference não encontrado"}), 40
-        
-        custom_data = json.loads(external_reference)
-
-        # Processa o status do pagamento
-        status = payment_details.get("status")
-        if status == "approved":
-            # Pagamento aprovado, gere o ingresso ou realize outras ações
-            print("Pagamento aprovado! Gerando ingresso...")
-            ticket_data = {
-            "name": custom_data['name'],
-            "email": payment_details["payer"]["email"],
-            "cpf": payment_details["payer"]["identification"]["number"],
-            "table": "tickets",
-            "user_id": custom_data["user_id"],
-            "quantity": custom_data['quantity'],  # Ajuste conforme necessário
-            "price": custom_data["price"],
-            "lot": custom_data["lot"],
-            "event_id": custom_data["event_id"]
-            }
-            print("Dados do ticket:", ticket_data)
-
-            # Faz uma requisição HTTP para a rota /generate_ticket
-            try:
-                response = requests.post(
-                    "http://127.0.0.1:3000/generate_ticket",  # URL da rota
-                    json=ticket_data,  # Dados do ticket
-                    headers={"Content-Type": "application/json"}
-                )
-                if response.status_code == 201:
-                    return jsonify({
-                        "success": True,
-                        "status": "approved",
-                        "message": "Pagamento aprovado!",
-                        "ticket": response.json()
-                    }), 200
-                else:
-                    return jsonify({
-                        "success": False,
-                        "error": f"Erro ao gerar ingresso: {response.json().get('error')}"
-                    }), response.status_code
-            except Exception as e:
-                return jsonify({
-                    "success": False,
-                    "error": f"Erro ao fazer requisição para /generate_ticket: {str(e)}"
-                }), 500
-        elif status in ["in_process", "pending"]:
-            # Pagamento em processamento
-            print("Pagamento em processamento...")
-        else:
-            # Pagamento rejeitado ou com erro
-            print(f"Pagamento não aprovado. Status: {status}")
-
-        return jsonify({"success": True}), 200
+    # Entregas repetidas de um pagamento já processado não voltam para a fila
+    if is_payment_processed(payment_id):
+        return jsonify({"success": True, "duplicate": True}), 200
 
+    try:
+        # Confirma o recebimento imediatamente; os workers da fila buscam os detalhes e emitem os ingressos
+        enqueue_payment(payment_id)
+        return jsonify({"success": True, "queued": True}), 200
     except Exception as e:
-        print("Erro ao processar webhook:", str(e))  # Log para debug
+        print("Erro ao enfileirar webhook:", str(e))  # Log para debug
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/process_payment', methods=['POST'])
@@ -220,6 +404,9 @@ def process_payment_route():
         'cardholderEmail': str,
         'transaction_amount': (int, float),
         'user_id': str,
+        'event_id': str,
+        'name': str,
+        'quantity': int,
         'price': (int, float),
         'lot': str,
         'address': dict  # Novo campo para o endereço
@@ -232,10 +419,21 @@ def process_payment_route():
         elif not isinstance(data[field], field_type if isinstance(field_type, tuple) else (field_type,)):
             errors.append(f"Campo '{field}' deve ser do tipo {field_type if isinstance(field_type, tuple) else field_type.__name__}")
 
+    if 'quantity' in data and isinstance(data['quantity'], int) and data['quantity'] < 1:
+        errors.append("Campo 'quantity' deve ser maior que zero")
+
     if errors:
         print("Erros de validação:", errors)  # Log para debug
         return jsonify({"success": False, "error": "; ".join(errors)}), 400
 
+    # Reserva os ingressos antes da cobrança para não vender além do estoque do lote
+    lot_id = resolve_lot_id(data['lot'])
+    if lot_id is None:
+        return jsonify({"success": False, "error": "Lote não encontrado"}), 400
+    reservation_id = reserve_lot(lot_id, data['quantity'])
+    if reservation_id is None:
+        return jsonify({"success": False, "error": "Lote esgotado"}), 409
+
     # Preparar os dados para a função process_payment
     try:
         external_reference = json.dumps({
@@ -244,7 +442,8 @@ def process_payment_route():
             "event_id": data['event_id'],
             "user_id": data['user_id'],
             "name": data['name'],
-            "quantity": data['quantity']
+            "quantity": data['quantity'],
+            "reservation_id": reservation_id
         })
 
         payment_data = {
@@ -270,7 +469,9 @@ def process_payment_route():
             "external_reference": external_reference
         }
         print("Iniciando o processamento de pagamento com os dados:", payment_data)
-    except (ValueError, TypeError) as e:
+    except (KeyError, ValueError, TypeError) as e:
+        # Campos do endereço ausentes ou inválidos: devolve a reserva antes de responder
+        release_reservation(reservation_id)
         return jsonify({"success": False, "error": f"Erro ao converter dados: {str(e)}"}), 400
 
     # Chamar a função para processar o pagamento
@@ -278,6 +479,7 @@ def process_payment_route():
     print("Resposta do process_payment:", payment_response)  # ADICIONE ESTE PRINT
 
     if payment_response["status"] == "approved":
+        confirm_reservation(reservation_id)
         return jsonify({
             "success": True,
             "status": "approved",
@@ -293,6 +495,7 @@ def process_payment_route():
             "payment": payment_response["payment"]
         }), 200
     else:
+        release_reservation(reservation_id)
         return jsonify({
             "success": False,
             "status": payment_response.get("status"),
@@ -322,7 +525,12 @@ def process_payment_pix_route():
         'user_id': str,
         'price': (int, float),  # Novo campo para o preço
         'lot': str,              # Novo campo para o lote
-        'quantity': int
+        'quantity': int,
+        'event_id': str,
+        'name': str,
+        'firstName': str,
+        'lastName': str,
+        'application_fee': float
     }
 
     errors = []
@@ -332,16 +540,28 @@ def process_payment_pix_route():
         elif not isinstance(data[field], field_type) and not (isinstance(data[field], (int, float)) and field_type in (int, float)):
             errors.append(f"Campo '{field}' deve ser do tipo {field_type.__name__}")
 
+    if 'quantity' in data and isinstance(data['quantity'], int) and data['quantity'] < 1:
+        errors.append("Campo 'quantity' deve ser maior que zero")
+
     if errors:
         return jsonify({"success": False, "error": "; ".join(errors)}), 400
 
+    # Reserva os ingressos enquanto o PIX não é pago
+    lot_id = resolve_lot_id(data['lot'])
+    if lot_id is None:
+        return jsonify({"success": False, "error": "Lote não encontrado"}), 400
+    reservation_id = reserve_lot(lot_id, data['quantity'])
+    if reservation_id is None:
+        return jsonify({"success": False, "error": "Lote esgotado"}), 409
+
     external_reference = json.dumps({
         "lot": data['lot'],
         "price": data['price'],
         "event_id": data['event_id'],
         "user_id": data['user_id'],
         "name": data['name'],
-        "quantity": data['quantity']
+        "quantity": data['quantity'],
+        "reservation_id": reservation_id
     })
     
     payment_data = {
@@ -356,7 +576,8 @@ def process_payment_pix_route():
             }
         },
         "application_fee": data["application_fee"],
-        "external_reference": external_reference
+        "external_reference": external_reference,
+        "date_of_expiration": (datetime.now(timezone.utc) + timedelta(seconds=RESERVATION_TTL)).isoformat(timespec='milliseconds')
 }
 
     # Chamar a função para processar o pagamento PIX
@@ -373,13 +594,18 @@ def process_payment_pix_route():
                 "pix_copia_cola": payment_response["pix_copia_cola"]  # Incluindo o código PIX copia e cola
             }), 200
     else:
+        release_reservation(reservation_id)
         return jsonify({"success": False, "status": payment_response.get("status"), "error": 
                         payment_response.get("error", "Erro ao processar pagamento PIX.")}), 400
 
 @app.route('/lotes', methods=['GET'])
 def listar_lotes_route():
     lotes = listar_lotes()
-    return jsonify(lotes), 200
+    response = jsonify(lotes)
+    # Permite revalidação barata por navegadores e CDN (If-None-Match -> 304)
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = f'public, max-age={int(LOTES_CACHE_TTL)}'
+    return response.make_conditional(request)
 
 @app.route('/lotes', methods=['POST'])
 def adicionar_lote_route():
@@ -416,6 +642,21 @@ def excluir_lote_route(id):
         return jsonify({'error': 'Lote não encontrado'}), 404
     
 
+@app.route('/lotes/<int:id>/shards', methods=['POST'])
+def particionar_lote_route(id):
+    data = request.json
+    shards = data.get('shards')
+
+    if not isinstance(shards, int):
+        return jsonify({'error': 'Número de shards é obrigatório'}), 400
+
+    try:
+        if enable_lot_sharding(id, shards):
+            return jsonify({'message': 'Particionamento do lote atualizado'}), 200
+        return jsonify({'error': 'Lote não encontrado ou alterado durante a operação'}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/user_tickets/<user_id>', methods=['GET'])
 def get_user_tickets_route(user_id):
     event_id = request.args.get('event_id')  # Filtro opcional por evento
@@ -516,6 +757,7 @@ def login():
 
         # Decodifica o IdToken para obter o user_id
         id_token = response["AuthenticationResult"]["IdToken"]
+        import jwt  # Carregado só no login
         decoded_token = jwt.decode(id_token, options={"verify_signature": False})
         user_id = decoded_token.get("sub")  # O campo 'sub' é o user_id no Cognito
 
@@ -656,52 +898,59 @@ def update_user():
     
 @app.route('/admin/balance', methods=['GET'])
 def get_balance():
-    admin_id = '7b87fd15-bea4-4fff-9033-9224fc0c8a01'  # Substitua pelo ID real do administrador
+    admin_id = ADMIN_ID
     balance = get_admin_balance(admin_id)
     return jsonify({'balance': float(balance)}), 200
 
 @app.route('/admin/withdraw', methods=['POST'])
 def withdraw():
-    admin_id = '7b87fd15-bea4-4fff-9033-9224fc0c8a01'  # Substitua pelo ID real do administrador
-    data = request.json
+    admin_id = ADMIN_ID
+    data = request.json or {}
     amount = data.get('amount')
 
     if amount is None:
         return jsonify({'error': 'Amount is required'}), 400
+    try:
+        amount = parse_amount(amount)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    balance = get_admin_balance(admin_id)
-    if balance < Decimal(str(amount)):
+    # Verificação de saldo e débito acontecem na mesma transação
+    withdrawal_id = add_withdrawal_request(admin_id, amount)
+    if withdrawal_id is None:
         return jsonify({'error': 'Saldo insuficiente'}), 400
-
-    if add_withdrawal_request(admin_id, amount):
-        update_admin_balance(admin_id, -Decimal(str(amount)))
-        return jsonify({'message': 'Solicitação de saque enviada'}), 200
+    if withdrawal_id:
+        return jsonify({'message': 'Solicitação de saque enviada', 'withdrawal_id': withdrawal_id}), 200
     else:
         return jsonify({'error': 'Erro ao processar saque'}), 500
 
 @app.route('/admin/withdrawals', methods=['GET'])
 def get_withdrawals():
-    admin_id = '7b87fd15-bea4-4fff-9033-9224fc0c8a01'  # Substitua pelo ID real do administrador
-    table = dynamodb.Table('admin_balance')
-    response = table.get_item(Key={'admin_id': admin_id})
-    if 'Item' in response:
-        withdrawals = response['Item'].get('withdrawal_requests', [])
-        return jsonify({'withdrawals': withdrawals}), 200
-    return jsonify({'withdrawals': []}), 200
+    admin_id = ADMIN_ID
+    limit = request.args.get('limit', 50, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit deve ser um inteiro maior que zero'}), 400
+    try:
+        withdrawals, next_cursor = list_withdrawals(admin_id, min(limit, MAX_PAGE_SIZE), request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'withdrawals': withdrawals, 'next_cursor': next_cursor}), 200
 
 @app.route('/admin/mark_withdrawal_done', methods=['POST'])
 def mark_withdrawal_done():
-    admin_id = '7b87fd15-bea4-4fff-9033-9224fc0c8a01'  # Substitua pelo ID real do administrador
-    data = request.json
-    index = data.get('index')
+    admin_id = ADMIN_ID
+    data = request.json or {}
+    withdrawal_id = data.get('withdrawal_id')
 
-    if index is None:
-        return jsonify({'error': 'Index is required'}), 400
+    if not isinstance(withdrawal_id, str) or not withdrawal_id:
+        return jsonify({'error': 'withdrawal_id is required'}), 400
 
-    if mark_withdrawal_as_done(admin_id, index):
-        return jsonify({'message': 'Saque marcado como realizado'}), 200
-    else:
-        return jsonify({'error': 'Erro ao marcar saque como realizado'}), 500
+    try:
+        if mark_withdrawal_as_done(admin_id, withdrawal_id):
+            return jsonify({'message': 'Saque marcado como realizado'}), 200
+        return jsonify({'error': 'Saque não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Erro ao marcar saque como realizado: {e}'}), 500
 
 if __name__ == '__main__':
     app.run(debug=True, port=3000)
@@ -1,6 +1,13 @@
+import os
+import sys
+
+# Permite rodar este arquivo diretamente (python auth_service/app.py ou de dentro de
+# auth_service/): a raiz do repositório entra no path para os pacotes compartilhados.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from services.cognito_service import CognitoService
+from auth_service.services.cognito_service import CognitoService
 import jwt  # Importe a biblioteca jwt
 
 app = Flask(__name__)
@@ -1,23 +1,24 @@
 import os
-import boto3
-from dotenv import load_dotenv
-from botocore.exceptions import ClientError
-import jwt  # Importe a biblioteca jwt
+from shared import aws
+from shared.aws import get_client
+from shared.config import load_env
 
 # Carrega as variáveis do .env
-load_dotenv()
+load_env()
 
 class CognitoService:
     def __init__(self):
-        self.client = boto3.client(
-            "cognito-idp",
-            region_name=os.getenv("AWS_REGION"),
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        )
+        self._client = None
         self.user_pool_id = os.getenv("AWS_COGNITO_USER_POOL_ID")
         self.client_id = os.getenv("AWS_COGNITO_CLIENT_ID")
 
+    @property
+    def client(self):
+        # Cliente compartilhado pelo processo (ver shared/aws.py), criado no primeiro uso
+        if self._client is None:
+            self._client = get_client("cognito-idp")
+        return self._client
+
     def check_email_exists(self, email):
         try:
             # Tenta encontrar usuários, incluindo os não confirmados
@@ -31,7 +32,7 @@ class CognitoService:
                     return {"exists": True, "status": "Usuário não confirmado"}
                 return {"exists": True, "status": "Usuário já registrado"}
             return {"exists": False, "status": "Usuário não encontrado"}
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def sign_up(self, email, password, name, birthdate, gender, phone_number):
@@ -49,7 +50,7 @@ class CognitoService:
                 ],
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def confirm_sign_up(self, email, code):
@@ -60,7 +61,7 @@ class CognitoService:
                 ConfirmationCode=code,
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def login(self, email, password):
@@ -74,7 +75,7 @@ class CognitoService:
                 },
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def logout(self, access_token):
@@ -83,7 +84,7 @@ class CognitoService:
                 AccessToken=access_token,
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def get_user(self, access_token):
@@ -92,7 +93,7 @@ class CognitoService:
                 AccessToken=access_token,
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
         
     def forgot_password(self, email):
@@ -102,7 +103,7 @@ class CognitoService:
                 Username=email
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     def confirm_forgot_password(self, email, code, new_password):
@@ -114,7 +115,7 @@ class CognitoService:
                 Password=new_password
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
         
     def get_user_by_email(self, email):
@@ -145,7 +146,7 @@ class CognitoService:
                     **user_details
                 }
             }
-        except ClientError as e:
+        except aws.ClientError as e:
             if e.response["Error"]["Code"] == "UserNotFoundException":
                 return {"status": "error", "message": "Usuário não encontrado"}
             raise Exception(e.response["Error"]["Message"])
@@ -157,7 +158,7 @@ class CognitoService:
                 Username=email
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
         
     def update_user(self, access_token, user_data):
@@ -172,5 +173,5 @@ class CognitoService:
                 ]
             )
             return response
-        except ClientError as e:
+        except aws.ClientError as e:
             raise Exception(e.response["Error"]["Message"])
\ No newline at end of file
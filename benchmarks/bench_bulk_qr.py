@@ -0,0 +1,65 @@
+"""
+Benchmark da exportação de QR Codes em lote com diferentes números de processos.
+
+Compara a geração um a um com generate_qr_code (um PNG gravado em disco por
+ingresso, como era feito antes) com stream_qr_zip e stream_qr_pdf usando 1, 2, 4...
+processos até --max-workers. Os arquivos gerados são descartados; o tempo medido
+inclui a inicialização do pool de processos.
+
+Uso:
+    python benchmarks/bench_bulk_qr.py --codes 20000 --max-workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticket_service.services.generate_code_service import generate_code
+from ticket_service.services import generate_qrcode_service as qr
+
+
+def timed(func):
+    start = time.perf_counter()
+    size = func()
+    return time.perf_counter() - start, size
+
+
+def one_by_one(codes):
+    with tempfile.TemporaryDirectory() as output_dir:
+        for code in codes:
+            qr.generate_qr_code(code, output_dir)
+        return sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+
+
+def drain(stream):
+    return sum(len(part) for part in stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--codes', type=int, default=20000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skip-baseline', action='store_true', help='não mede a geração um a um')
+    args = parser.parse_args()
+
+    codes = [generate_code() for _ in range(args.codes)]
+    print(f"{args.codes} códigos, {os.cpu_count()} CPUs")
+
+    if not args.skip_baseline:
+        elapsed, size = timed(lambda: one_by_one(codes))
+        print(f"{'um a um':<10} {'-':>3}  {elapsed:7.2f} s  {args.codes / elapsed:8.0f} QR/s  {size / 2**20:7.1f} MiB")
+
+    workers = 1
+    while workers <= args.max_workers:
+        for label, export in (('zip', lambda: drain(qr.stream_qr_zip(codes, workers=workers))),
+                              ('pdf', lambda: drain(qr.stream_qr_pdf(codes, workers=workers)))):
+            elapsed, size = timed(export)
+            print(f"{label:<10} {workers:>3}  {elapsed:7.2f} s  {args.codes / elapsed:8.0f} QR/s  {size / 2**20:7.1f} MiB")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark da validação de ingressos com vários portões lendo ao mesmo tempo.
+
+Compara a validação antiga (get_item, put_item e delete_item separados) com
+move_ticket_to_validated em uma única transação. O DynamoDB é simulado em
+memória com uma latência fixa por chamada (--latency), e parte dos códigos é
+lida em dois portões ao mesmo tempo para medir validações duplicadas.
+
+Uso:
+    python benchmarks/bench_gate_validation.py --gates 8 --tickets 400 --latency 8
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for key, value in {
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'AWS_REGION': 'us-east-1',
+}.items():
+    os.environ.setdefault(key, value)
+
+from botocore.exceptions import ClientError
+from ticket_service.utils import db
+
+
+class FakeDynamo:
+    """DynamoDB em memória com latência por chamada e as condições usadas na validação."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.meta = self
+
+    @property
+    def client(self):
+        return self
+
+    def Table(self, name):
+        return FakeTable(self, name)
+
+    def _call(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def _key(self, name, key):
+        return (name, key['event_id'], key['code'])
+
+    def _check(self, name, key, condition):
+        exists = self._key(name, key) in self.tables
+        if condition == 'attribute_not_exists(code)':
+            return not exists
+        if condition == 'attribute_exists(code)':
+            return exists
+        return True
+
+    def transact_write_items(self, TransactItems):
+        self._call()
+        with self.lock:
+            actions = [(kind, spec) for item in TransactItems for kind, spec in item.items()]
+            reasons = []
+            for kind, spec in actions:
+                key = spec['Item'] if kind == 'Put' else spec['Key']
+                ok = self._check(spec['TableName'], key, spec.get('ConditionExpression'))
+                reasons.append({'Code': 'None' if ok else 'ConditionalCheckFailed'})
+            if any(r['Code'] != 'None' for r in reasons):
+                raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                                   'CancellationReasons': reasons}, 'TransactWriteItems')
+            for kind, spec in actions:
+                if kind == 'Put':
+                    self.tables[self._key(spec['TableName'], spec['Item'])] = dict(spec['Item'])
+                else:
+                    self.tables.pop(self._key(spec['TableName'], spec['Key']), None)
+
+
+class FakeTable:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def get_item(self, Key, **kwargs):
+        self.store._call()
+        item = self.store.tables.get(self.store._key(self.name, Key))
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.store._call()
+        self.store.tables[self.store._key(self.name, Item)] = dict(Item)
+
+    def delete_item(self, Key, **kwargs):
+        self.store._call()
+        self.store.tables.pop(self.store._key(self.name, Key), None)
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+def legacy_move_ticket_to_validated(event_id, code):
+    """Implementação anterior: três chamadas sem atomicidade."""
+    tickets_table = db.dynamodb.Table(db.TICKETS_TABLE)
+    validated_table = db.dynamodb.Table(db.VALIDATED_TICKETS_TABLE)
+    ticket = tickets_table.get_item(Key={'event_id': event_id, 'code': code}).get('Item')
+    if ticket:
+        validated_table.put_item(Item=ticket)
+        tickets_table.delete_item(Key={'event_id': event_id, 'code': code})
+        return True
+    return False
+
+
+def run(validate, args):
+    store = FakeDynamo(args.latency / 1000)
+    db.dynamodb = store
+    db.get_table = store.Table
+    codes = [f'C{i:05d}' for i in range(args.tickets)]
+    for code in codes:
+        store.tables[(db.TICKETS_TABLE, 'bench', code)] = {'event_id': 'bench', 'code': code}
+
+    # Uma fração dos ingressos é apresentada em dois portões ao mesmo tempo
+    scans = codes + random.sample(codes, int(len(codes) * args.duplicates))
+    random.shuffle(scans)
+
+    latencies = []
+    accepted = {}
+    lock = threading.Lock()
+
+    def scan(code):
+        start = time.perf_counter()
+        ok = validate('bench', code)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if ok:
+                accepted[code] = accepted.get(code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.gates) as pool:
+        list(pool.map(scan, scans))
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'throughput': len(scans) / total,
+        'calls': store.calls,
+        'double': sum(1 for count in accepted.values() if count > 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gates', type=int, default=8)
+    parser.add_argument('--tickets', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=8, help='latência por chamada ao DynamoDB, em ms')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fração de ingressos lidos em dois portões')
+    args = parser.parse_args()
+
+    for label, validate in (('3 chamadas', legacy_move_ticket_to_validated),
+                            ('transação', db.move_ticket_to_validated)):
+        result = run(validate, args)
+        print(f"{label:<11} p50 {result['p50']:6.1f} ms  p95 {result['p95']:6.1f} ms  "
+              f"{result['throughput']:7.1f} leituras/s  {result['calls']:5d} chamadas  "
+              f"{result['double']:3d} validações duplicadas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark de leituras concorrentes do banco de notícias com um admin escrevendo ao mesmo tempo.
+
+Compara o acesso antigo (uma conexão nova por chamada, journal padrão) com as
+conexões por thread em WAL de news_service.db, lendo a primeira página do feed com
+--rows notícias. Várias threads leem o feed em laço enquanto outra insere notícias;
+são medidos a vazão, a latência das leituras e os erros "database is locked".
+
+Uso:
+    python benchmarks/bench_news_db.py --readers 16 --seconds 5 --rows 200
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp(prefix='bench_news_')
+os.environ.setdefault('NEWS_DATABASE_PATH', workdir)
+os.environ.setdefault('NEWS_DATABASE_NAME', 'news.db')
+
+from news_service import db as news_db
+
+
+def legacy_add_news(image, title, subtitle, date):
+    """Implementação anterior: conexão nova a cada chamada, sem WAL."""
+    with sqlite3.connect(news_db.NEWS_DATABASE) as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO news (image, title, subtitle, date) VALUES (?, ?, ?, ?)',
+                       (image, title, subtitle, date))
+        conn.commit()
+        return cursor.lastrowid
+
+
+def legacy_get_all_news():
+    with sqlite3.connect(news_db.NEWS_DATABASE) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM news')
+        return cursor.fetchall()
+
+
+def setup(path, wal, rows):
+    news_db.NEWS_DATABASE = path
+    if wal:
+        news_db.init_news_db()
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE IF NOT EXISTS news (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                 'image TEXT NOT NULL, title TEXT NOT NULL, subtitle TEXT NOT NULL, date TEXT NOT NULL)')
+    with conn:
+        conn.executemany('INSERT INTO news (image, title, subtitle, date) VALUES (?, ?, ?, ?)',
+                         [(f'https://cdn/{i}.jpg', f'Notícia {i}', 'Subtítulo ' * 10, '2026-01-01') for i in range(rows)])
+    conn.close()
+
+
+def run(read, write, args):
+    stop = threading.Event()
+    latencies, errors, writes = [], [], [0]
+    lock = threading.Lock()
+
+    def reader():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                read()
+                local.append((time.perf_counter() - start) * 1000)
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+        with lock:
+            latencies.extend(local)
+
+    def writer():
+        while not stop.is_set():
+            try:
+                write('https://cdn/nova.jpg', 'Nova notícia', 'Subtítulo', '2026-01-02')
+                writes[0] += 1
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+            time.sleep(args.write_interval / 1000)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / args.seconds,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'writes': writes[0],
+        'locked': sum(1 for error in errors if 'locked' in error),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--write-interval', type=float, default=5, help='pausa entre as escritas do admin, em ms')
+    args = parser.parse_args()
+
+    def read_page():
+        return news_db.get_news_page(limit=args.rows)
+
+    for label, wal, read, write in (('conexão/chamada', False, legacy_get_all_news, legacy_add_news),
+                                    ('pool WAL', True, read_page, news_db.add_news)):
+        setup(os.path.join(workdir, f'news_{"wal" if wal else "legacy"}.db'), wal, args.rows)
+        result = run(read, write, args)
+        print(f"{label:<16} {result['throughput']:8.0f} leituras/s  p50 {result['p50']:6.2f} ms  "
+              f"p95 {result['p95']:6.2f} ms  {result['writes']:5d} escritas  {result['locked']:4d} erros de lock")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark do tempo de boot do app.py e do custo de importação de cada módulo.
+
+Cada rodada sobe um interpretador novo com `python -X importtime`, importa o app e
+faz a primeira requisição a /news e depois a /lotes, registrando quais dependências
+pesadas (boto3, mercadopago, qrcode, Pillow, jwt) já estavam carregadas em cada etapa.
+O DynamoDB é um servidor local do moto (DYNAMODB_ENDPOINT_URL), e Mercado Pago e
+Cognito recebem credenciais fictícias: como os SDKs são criados no primeiro uso,
+nenhuma chamada externa é feita.
+
+Uso:
+    python benchmarks/bench_startup.py --runs 5 --top 15
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ('boto3', 'mercadopago', 'qrcode', 'PIL', 'jwt')
+
+
+def child():
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+
+    loaded = {}
+    loaded['import'] = [name for name in HEAVY_MODULES if name in sys.modules]
+    client = app.app.test_client()
+    assert client.get('/news').status_code == 200
+    news = time.perf_counter()
+    loaded['/news'] = [name for name in HEAVY_MODULES if name in sys.modules]
+    assert client.get('/lotes').status_code == 200
+    lotes = time.perf_counter()
+    loaded['/lotes'] = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    sys.stdout.write(json.dumps({
+        'import': imported - start,
+        '/news': news - imported,
+        '/lotes': lotes - news,
+        'loaded': loaded,
+    }) + '\n')
+    # Encerra sem esperar as threads de segundo plano do app
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def import_costs(stderr):
+    """Maior tempo cumulativo de importação (µs) de cada pacote raiz, a partir do -X importtime."""
+    costs = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        root = name.strip().split('.')[0]
+        costs[root] = max(costs.get(root, 0), int(cumulative))
+    return costs
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='quantidade de pacotes na tabela de importação')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child()
+
+    from moto.server import ThreadedMotoServer
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    port = free_port()
+    env = dict(os.environ, **{
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'AWS_REGION': 'us-east-1',
+        'DYNAMODB_ENDPOINT_URL': f'http://127.0.0.1:{port}',
+        'MP_ACCESS_TOKEN': 'TEST-bench',
+        'AWS_COGNITO_USER_POOL_ID': 'bench',
+        'AWS_COGNITO_CLIENT_ID': 'bench',
+        'NEWS_DATABASE_PATH': workdir,
+        'NEWS_DATABASE_NAME': 'news.db',
+        'ASSETS_PATH': os.path.join(workdir, 'assets'),
+        'WEBHOOK_QUEUE_DATABASE': os.path.join(workdir, 'webhook_queue.db'),
+        'PYTHONPATH': ROOT,
+    })
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    try:
+        subprocess.run([sys.executable, os.path.join(ROOT, 'manage.py'), 'provision'],
+                       env=env, check=True, capture_output=True)
+
+        timings, costs = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-X', 'importtime', __file__, '--child'],
+                                    env=env, cwd=ROOT, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if result.returncode != 0:
+                sys.exit(result.stderr)
+            timing = json.loads(result.stdout.strip().splitlines()[-1])
+            timing['process'] = elapsed
+            timings.append(timing)
+            costs.append(import_costs(result.stderr))
+    finally:
+        server.stop()
+
+    print(f"{args.runs} rodadas (mediana)")
+    for step in ('process', 'import', '/news', '/lotes'):
+        print(f"  {step:<8} {statistics.median(t[step] for t in timings) * 1000:8.1f} ms")
+    for step, modules in timings[-1]['loaded'].items():
+        print(f"  carregados após {step}: {', '.join(modules) or '-'}")
+
+    print(f"\nImportação por pacote (cumulativo, mediana, {args.top} maiores)")
+    roots = {root for run in costs for root in run}
+    medians = {root: statistics.median(run.get(root, 0) for run in costs) for root in roots}
+    for root, cost in sorted(medians.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {root:<24} {cost / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
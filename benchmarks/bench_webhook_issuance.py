@@ -0,0 +1,190 @@
+"""
+Benchmark da latência do /webhook: fila em processo x loopback HTTP para /generate_ticket.
+
+Sobe o app em um servidor local, simula pagamentos aprovados e mede o tempo de
+resposta do webhook nos dois modos. Mercado Pago e DynamoDB são substituídos
+por versões em memória com latência simulada por chamada (--latency).
+
+Uso:
+    python benchmarks/bench_webhook_issuance.py --requests 200 --quantity 2 --latency 30
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Valores fictícios para importar o app sem credenciais reais
+for key, value in {
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'AWS_REGION': 'us-east-1',
+    'MP_ACCESS_TOKEN': 'TEST-bench',
+    'NEWS_DATABASE_PATH': '/tmp/bench_news',
+    'NEWS_DATABASE_NAME': 'news.db',
+    'ASSETS_PATH': '/tmp/bench_assets',
+    'WEBHOOK_QUEUE_DATABASE': '/tmp/bench_webhook_queue.db',
+    'DYNAMODB_TABLE_CHECK': 'off',
+}.items():
+    os.environ.setdefault(key, value)
+
+import requests
+from unittest import mock
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+PORT = 3000
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def fake_payment(payment_id, quantity):
+    return {
+        "status": "approved",
+        "payer": {"email": "bench@example.com", "identification": {"number": "00000000000"}},
+        "external_reference": json.dumps({
+            "lot": "1", "price": 10, "event_id": "bench", "user_id": f"user-{payment_id}",
+            "name": "Bench", "quantity": quantity,
+        }),
+    }
+
+
+def install_fakes(app_module, quantity, latency):
+    """Substitui Mercado Pago e DynamoDB por versões em memória."""
+    from ticket_service.services import issue_ticket_service
+
+    stored = {}
+    lock = threading.Lock()
+
+    def get_payment_details(payment_id):
+        time.sleep(latency)
+        return fake_payment(payment_id, quantity)
+
+    def update_admin_balance(*args):
+        time.sleep(latency)
+        return True
+
+    def store_tickets_batch(event_id, quantity, *args, payment_id=None, **kwargs):
+        code_generator = args[-1]
+        time.sleep(latency)
+        with lock:
+            codes = [code_generator() for _ in range(quantity)]
+            stored.update({code: event_id for code in codes})
+            if payment_id:
+                ledger[payment_id].setdefault('codes', []).extend(codes)
+        return codes
+
+    # Ledger de pagamentos em memória
+    ledger = {}
+
+    def get_processed_payment(payment_id, consistent_read=False):
+        with lock:
+            return dict(ledger[payment_id]) if payment_id in ledger else None
+
+    def claim_payment(payment_id):
+        with lock:
+            if payment_id in ledger and ledger[payment_id]['status'] != 'processing':
+                return False
+            ledger.setdefault(payment_id, {})['status'] = 'processing'
+            return True
+
+    def complete_payment(payment_id, status):
+        with lock:
+            ledger[payment_id]['status'] = status
+
+    def credit_payment_balance(admin_id, payment_id, amount):
+        time.sleep(latency)
+        with lock:
+            ledger[payment_id]['credited'] = True
+        return True
+
+    patches = [
+        mock.patch.object(app_module, 'get_payment_details', get_payment_details),
+        mock.patch.object(issue_ticket_service, 'get_payment_details', get_payment_details),
+        mock.patch.object(issue_ticket_service, 'store_tickets_batch', store_tickets_batch),
+        mock.patch.object(issue_ticket_service, 'update_admin_balance', update_admin_balance),
+        mock.patch.object(issue_ticket_service, 'credit_payment_balance', credit_payment_balance),
+        mock.patch.object(issue_ticket_service, 'get_processed_payment', get_processed_payment),
+        mock.patch.object(issue_ticket_service, 'claim_payment', claim_payment),
+        mock.patch.object(issue_ticket_service, 'release_payment_claim', lambda payment_id: None),
+        mock.patch.object(issue_ticket_service, 'complete_payment', complete_payment),
+    ]
+    for patch in patches:
+        patch.start()
+    return patches
+
+
+def register_legacy_webhook(app_module):
+    """Rota equivalente ao webhook antigo, que chamava /generate_ticket via HTTP."""
+    def legacy_webhook():
+        payment_id = app_module.request.json['data']['id']
+        details = app_module.get_payment_details(payment_id)
+        custom_data = json.loads(details["external_reference"])
+        response = requests.post(f"http://127.0.0.1:{PORT}/generate_ticket", json={
+            "name": custom_data['name'],
+            "email": details["payer"]["email"],
+            "cpf": details["payer"]["identification"]["number"],
+            "user_id": custom_data["user_id"],
+            "quantity": custom_data['quantity'],
+            "price": custom_data["price"],
+            "lot": custom_data["lot"],
+            "event_id": custom_data["event_id"],
+        })
+        return app_module.jsonify({"success": True, "ticket": response.json()}), 200
+
+    app_module.app.add_url_rule('/_bench/legacy_webhook', 'legacy_webhook', legacy_webhook, methods=['POST'])
+
+
+def run(url, total, session):
+    latencies = []
+    for i in range(total):
+        start = time.perf_counter()
+        response = session.post(url, json={"data": {"id": str(i)}})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    sys.stdout.write(f"{label:<12} média {statistics.mean(latencies):7.2f} ms   "
+                     f"p50 {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--quantity', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=30, help='latência simulada por chamada externa, em ms')
+    args = parser.parse_args()
+
+    import app as app_module
+
+    install_fakes(app_module, args.quantity, args.latency / 1000)
+    register_legacy_webhook(app_module)
+
+    server = make_server('127.0.0.1', PORT, app_module.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    session = requests.Session()
+    base = f"http://127.0.0.1:{PORT}"
+    # Os logs dos workers da fila continuam em segundo plano durante a medição
+    with mock.patch('builtins.print'):
+        run(f"{base}/webhook", 20, session)  # Aquecimento
+        legacy = run(f"{base}/_bench/legacy_webhook", args.requests, session)
+        queued = run(f"{base}/webhook", args.requests, session)
+
+        report("loopback", legacy)
+        report("fila", queued)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
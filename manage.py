@@ -0,0 +1,101 @@
+"""
+Tarefas administrativas executadas fora do servidor web.
+
+Uso:
+    python manage.py provision
+    python manage.py compact-balance [--interval SEGUNDOS]
+    python manage.py check-balance
+    python manage.py migrate-withdrawals
+    python manage.py migrate-news-images
+"""
+import argparse
+import time
+from ticket_service.utils.db import (
+    ADMIN_ID, ensure_table_exists, missing_tables, compact_admin_balance, check_admin_balance, migrate_legacy_withdrawals
+)
+
+
+def provision(args):
+    missing = missing_tables()
+    if args.check:
+        if missing:
+            print(f"Tabelas ausentes: {', '.join(missing)}")
+            raise SystemExit(1)
+    else:
+        if missing:
+            print(f"Criando tabelas: {', '.join(missing)}")
+        # Também adiciona índices que faltem em tabelas já existentes
+        ensure_table_exists()
+    print("Tabelas do DynamoDB prontas")
+
+
+def compact_balance(args):
+    while True:
+        moved = compact_admin_balance(args.admin_id)
+        print(f"Saldo compactado: {moved} transferido para o item principal")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+def check_balance(args):
+    report = check_admin_balance(args.admin_id)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if not report['consistent']:
+        raise SystemExit(1)
+
+
+def migrate_withdrawals(args):
+    count = migrate_legacy_withdrawals(args.admin_id)
+    print(f"{count} saques migrados para o ledger")
+
+
+def migrate_news_images(args):
+    from news_service.db import init_news_db, get_news_with_inline_images, update_news_image
+    from news_service.images import ingest_news_image
+
+    init_news_db()
+    migrated = failed = 0
+    for news_id, image in get_news_with_inline_images():
+        try:
+            url, variants = ingest_news_image(image)
+        except ValueError as e:
+            print(f"Notícia {news_id}: {e}")
+            failed += 1
+            continue
+        update_news_image(news_id, url, variants)
+        migrated += 1
+    print(f"{migrated} imagens de notícias migradas, {failed} com erro")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    provision_parser = subparsers.add_parser('provision', help='cria as tabelas e índices do DynamoDB')
+    provision_parser.add_argument('--check', action='store_true', help='apenas confere se as tabelas existem')
+    provision_parser.set_defaults(func=provision)
+
+    compact = subparsers.add_parser('compact-balance', help='move o saldo dos shards para o item principal')
+    compact.add_argument('--admin-id', default=ADMIN_ID)
+    compact.add_argument('--interval', type=int, default=0, help='repete a cada N segundos')
+    compact.set_defaults(func=compact_balance)
+
+    check = subparsers.add_parser('check-balance', help='confere o saldo contra tickets e saques')
+    check.add_argument('--admin-id', default=ADMIN_ID)
+    check.set_defaults(func=check_balance)
+
+    migrate = subparsers.add_parser('migrate-withdrawals', help='move a lista antiga de saques para o ledger')
+    migrate.add_argument('--admin-id', default=ADMIN_ID)
+    migrate.set_defaults(func=migrate_withdrawals)
+
+    news_images = subparsers.add_parser('migrate-news-images', help='move as imagens em data URI das notícias para o armazenamento')
+    news_images.set_defaults(func=migrate_news_images)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
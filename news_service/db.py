@@ -1,8 +1,12 @@
+import html
+import json
+import re
 import sqlite3
 import os
-from dotenv import load_dotenv
+import threading
+from shared.config import load_env
 
-load_dotenv()
+load_env()
 
 NEWS_DIRETORIO = os.environ['NEWS_DATABASE_PATH']
 NEWS_NOME_BANCO = os.environ['NEWS_DATABASE_NAME']
@@ -10,10 +14,55 @@ NEWS_NOME_BANCO = os.environ['NEWS_DATABASE_NAME']
 # Cria o caminho completo para o banco de dados de notícias
 NEWS_DATABASE = os.path.join(NEWS_DIRETORIO, NEWS_NOME_BANCO)
 
+# Tempo (em segundos) que uma conexão espera pelo lock de escrita antes de falhar
+NEWS_BUSY_TIMEOUT = float(os.environ.get('NEWS_BUSY_TIMEOUT', 5))
+# Quantidade de consultas preparadas mantidas em cache por conexão
+NEWS_CACHED_STATEMENTS = int(os.environ.get('NEWS_CACHED_STATEMENTS', 64))
+
+# Tamanho padrão e máximo das páginas do feed
+NEWS_PAGE_SIZE = int(os.environ.get('NEWS_PAGE_SIZE', 20))
+NEWS_MAX_PAGE_SIZE = int(os.environ.get('NEWS_MAX_PAGE_SIZE', 100))
+
+# Colunas da listagem, na ordem usada pelas rotas. O feed usa todas as colunas atuais (a imagem
+# guarda só a URL, ver news_service.images); a lista explícita evita que colunas novas e pesadas
+# entrem na listagem sem querer, como aconteceria com SELECT *.
+NEWS_LIST_COLUMNS = 'id, image, title, subtitle, date, image_variants'
+
+# Limites da busca textual
+NEWS_SEARCH_MAX_TERMS = 10
+NEWS_SEARCH_MAX_OFFSET = 1000
+
+# Marcadores que o FTS5 insere em volta dos termos encontrados; viram <mark> depois do escape do HTML
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+_local = threading.local()
+
+def _connect():
+    conn = sqlite3.connect(NEWS_DATABASE, timeout=NEWS_BUSY_TIMEOUT, cached_statements=NEWS_CACHED_STATEMENTS)
+    # Em WAL, NORMAL só sincroniza o disco nos checkpoints e continua seguro contra quedas do processo
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def get_connection():
+    """
+    Conexão da thread atual com o banco de notícias, aberta no primeiro uso e reutilizada.
+
+    Cada thread do servidor mantém a sua conexão; com o banco em WAL as leituras não
+    bloqueiam a escrita do admin nem umas às outras.
+    """
+    conn = getattr(_local, 'conn', None)
+    # A conexão é refeita se o processo foi criado por fork depois de abri-la
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
 def init_news_db():
     os.makedirs(NEWS_DIRETORIO, exist_ok=True)
-    
-    with sqlite3.connect(NEWS_DATABASE) as conn:
+
+    with sqlite3.connect(NEWS_DATABASE, timeout=NEWS_BUSY_TIMEOUT) as conn:
+        # O modo WAL fica gravado no arquivo e vale para todas as conexões seguintes
+        conn.execute('PRAGMA journal_mode=WAL')
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS news (
@@ -24,20 +73,165 @@ def init_news_db():
                 date TEXT NOT NULL
             )
         ''')
-        conn.commit()
+        # URLs das variantes redimensionadas da imagem (JSON {largura: url}), em bancos antigos via ALTER
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(news)')]
+        if 'image_variants' not in columns:
+            cursor.execute('ALTER TABLE news ADD COLUMN image_variants TEXT')
 
-def add_news(image, title, subtitle, date):
-    with sqlite3.connect(NEWS_DATABASE) as conn:
-        cursor = conn.cursor()
+        # Índice do feed, ordenado da notícia mais recente para a mais antiga
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_date_id ON news (date DESC, id DESC)')
+
+        # Versão do conteúdo, incrementada por triggers a cada alteração nas notícias.
+        # Os caches do feed em cada processo comparam essa versão para saber se ficaram velhos.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS news_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO news_meta (key, value) VALUES ('version', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS news_version_{event.lower()} AFTER {event} ON news
+                BEGIN
+                    UPDATE news_meta SET value = value + 1 WHERE key = 'version';
+                END
+            ''')
+
+        # Índice de busca textual (FTS5) sobre título e subtítulo, mantido pelos triggers abaixo.
+        # O conteúdo fica só na tabela news; o índice guarda apenas os termos.
+        fts_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+        ).fetchone()
         cursor.execute('''
-            INSERT INTO news (image, title, subtitle, date)
-            VALUES (?, ?, ?, ?)
-        ''', (image, title, subtitle, date))
+            CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+                title, subtitle,
+                content='news', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+                INSERT INTO news_fts (rowid, title, subtitle) VALUES (new.id, new.title, new.subtitle);
+            END;
+            CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+                INSERT INTO news_fts (news_fts, rowid, title, subtitle) VALUES ('delete', old.id, old.title, old.subtitle);
+            END;
+            CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF title, subtitle ON news BEGIN
+                INSERT INTO news_fts (news_fts, rowid, title, subtitle) VALUES ('delete', old.id, old.title, old.subtitle);
+                INSERT INTO news_fts (rowid, title, subtitle) VALUES (new.id, new.title, new.subtitle);
+            END;
+        ''')
+        if not fts_exists:
+            # Indexa as notícias que já existiam antes da busca
+            cursor.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
         conn.commit()
-        return cursor.lastrowid
-    
-def get_all_news():
-    with sqlite3.connect(NEWS_DATABASE) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM news')
-        return cursor.fetchall()
\ No newline at end of file
+
+def add_news(image, title, subtitle, date, image_variants=None):
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO news (image, title, subtitle, date, image_variants)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (image, title, subtitle, date, json.dumps(image_variants) if image_variants else None))
+    return cursor.lastrowid
+
+def update_news_image(news_id, image, image_variants=None):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'UPDATE news SET image = ?, image_variants = ? WHERE id = ?',
+            (image, json.dumps(image_variants) if image_variants else None, news_id)
+        )
+
+def get_news_with_inline_images(batch_size=50):
+    """IDs e imagens das notícias que ainda guardam a imagem como data URI, em lotes."""
+    last_id = 0
+    while True:
+        rows = get_connection().execute('''
+            SELECT id, image FROM news
+            WHERE id > ? AND image LIKE 'data:%'
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+def get_news_page(before=None, limit=NEWS_PAGE_SIZE):
+    """
+    Página do feed, da notícia mais recente para a mais antiga, com paginação por chave.
+
+    `before` é o ID da última notícia da página anterior; a consulta continua a partir
+    do par (date, id) dela pelo índice, sem OFFSET. Retorna (linhas, before da próxima
+    página ou None). Lança ValueError se `before` não existir.
+    """
+    conn = get_connection()
+    if before is None:
+        rows = conn.execute(f'''
+            SELECT {NEWS_LIST_COLUMNS} FROM news
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        ''', (limit + 1,)).fetchall()
+    else:
+        anchor = conn.execute('SELECT date, id FROM news WHERE id = ?', (before,)).fetchone()
+        if anchor is None:
+            raise ValueError('Notícia de referência não encontrada')
+        rows = conn.execute(f'''
+            SELECT {NEWS_LIST_COLUMNS} FROM news
+            WHERE (date, id) < (?, ?)
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        ''', (*anchor, limit + 1)).fetchall()
+
+    next_before = rows[limit - 1][0] if len(rows) > limit else None
+    return rows[:limit], next_before
+
+def get_news_version():
+    """Versão atual do conteúdo das notícias (muda a cada inserção, edição ou exclusão)."""
+    row = get_connection().execute("SELECT value FROM news_meta WHERE key = 'version'").fetchone()
+    return row[0] if row else 0
+
+def build_search_query(text):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra vira um termo entre aspas, então operadores e aspas do usuário não
+    são interpretados; a última palavra casa por prefixo para a busca enquanto digita.
+    Retorna None se não houver palavras.
+    """
+    terms = re.findall(r'\w+', text or '')[:NEWS_SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def _highlight(snippet):
+    """Escapa o HTML do trecho e troca os pares de marcadores do FTS5 por <mark>...</mark>."""
+    escaped = html.escape(snippet or '')
+    marked = re.sub(f'{_MARK_START}([^{_MARK_START}{_MARK_END}]*){_MARK_END}', r'<mark>\1</mark>', escaped)
+    # Marcadores avulsos (que já estavam no texto cadastrado) são descartados
+    return marked.replace(_MARK_START, '').replace(_MARK_END, '')
+
+def search_news(text, limit=NEWS_PAGE_SIZE, offset=0):
+    """
+    Busca notícias pelo título e subtítulo, ordenadas por relevância (bm25, com peso maior no título).
+
+    Retorna as linhas da listagem seguidas de um trecho com os termos destacados em <mark>.
+    O restante do trecho tem o HTML escapado, já que vem do texto cadastrado.
+    """
+    query = build_search_query(text)
+    if query is None:
+        return []
+    columns = ', '.join(f'news.{column.strip()}' for column in NEWS_LIST_COLUMNS.split(','))
+    rows = get_connection().execute(f'''
+        SELECT {columns}, snippet(news_fts, -1, ?, ?, '…', 12)
+        FROM news_fts
+        JOIN news ON news.id = news_fts.rowid
+        WHERE news_fts MATCH ?
+        ORDER BY bm25(news_fts, 2.0, 1.0)
+        LIMIT ? OFFSET ?
+    ''', (_MARK_START, _MARK_END, query, limit, offset)).fetchall()
+    return [(*row[:-1], _highlight(row[-1])) for row in rows]
@@ -0,0 +1,61 @@
+import gzip
+import hashlib
+import json
+import os
+from news_service.db import get_news_page, get_news_version
+from ticket_service.utils.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele o feed é servido com gzip
+    brotli = None
+
+# Páginas do feed mantidas em memória; a chave inclui a versão do conteúdo, então
+# alterações em qualquer processo tornam as entradas antigas inalcançáveis
+NEWS_FEED_CACHE_SIZE = int(os.environ.get('NEWS_FEED_CACHE_SIZE', 64))
+NEWS_FEED_CACHE_TTL = float(os.environ.get('NEWS_FEED_CACHE_TTL', 3600))
+
+_feed_cache = TTLCache(maxsize=NEWS_FEED_CACHE_SIZE, ttl=NEWS_FEED_CACHE_TTL)
+
+def news_item(row):
+    """Dicionário da notícia a partir de uma linha com as colunas de NEWS_LIST_COLUMNS."""
+    return {
+        'id': row[0],
+        'image': row[1],
+        'title': row[2],
+        'subtitle': row[3],
+        'date': row[4],
+        'image_variants': json.loads(row[5]) if row[5] else {}
+    }
+
+def _serialize(news):
+    return json.dumps([news_item(n) for n in news], separators=(',', ':')).encode()
+
+def get_news_feed(before, limit):
+    """
+    Página do feed já serializada, com as versões comprimidas e os ETags de cada codificação.
+
+    Retorna um dicionário com `next_before` e, por codificação ('identity', 'gzip' e,
+    se o brotli estiver instalado, 'br'), o par (corpo, etag). Lança ValueError se
+    `before` não existir.
+    """
+    key = (get_news_version(), before, limit)
+    entry = _feed_cache.get(key)
+    if entry is None:
+        news, next_before = get_news_page(before, limit)
+        body = _serialize(news)
+        digest = hashlib.sha256(body).hexdigest()
+        entry = {
+            'next_before': next_before,
+            'identity': (body, digest),
+            # mtime fixo para que o mesmo conteúdo gere sempre os mesmos bytes
+            'gzip': (gzip.compress(body, compresslevel=6, mtime=0), f'{digest}-gzip'),
+        }
+        if brotli is not None:
+            entry['br'] = (brotli.compress(body), f'{digest}-br')
+        _feed_cache.set(key, entry)
+    return entry
+
+def invalidate_news_feed():
+    """Descarta as páginas em cache deste processo (os demais percebem pela versão)."""
+    _feed_cache.invalidate()
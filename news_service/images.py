@@ -0,0 +1,111 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+from shared.config import load_env
+
+load_env()
+
+# Onde as imagens das notícias são gravadas: 'local' (diretório servido em /media) ou 's3'
+NEWS_IMAGES_BACKEND = os.environ.get('NEWS_IMAGES_BACKEND', 'local')
+NEWS_IMAGES_DIR = os.environ.get('NEWS_IMAGES_DIR', 'media')
+NEWS_IMAGES_BUCKET = os.environ.get('NEWS_IMAGES_BUCKET')
+# URL pública das imagens (CDN, bucket ou o próprio /media do app)
+NEWS_IMAGES_BASE_URL = os.environ.get('NEWS_IMAGES_BASE_URL', '/media').rstrip('/')
+NEWS_IMAGE_MAX_BYTES = int(os.environ.get('NEWS_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+
+# Larguras das variantes responsivas; a imagem nunca é ampliada
+NEWS_IMAGE_WIDTHS = tuple(int(width) for width in os.environ.get('NEWS_IMAGE_WIDTHS', '320,640,1280').split(','))
+NEWS_IMAGE_QUALITY = int(os.environ.get('NEWS_IMAGE_QUALITY', 80))
+
+def is_data_uri(value):
+    return isinstance(value, str) and value.startswith('data:')
+
+def decode_data_uri(data_uri):
+    """Extrai os bytes de um data URI em base64 (`data:image/png;base64,...`)."""
+    header, _, data = data_uri.partition(',')
+    if not header.startswith('data:image/') or not header.endswith(';base64') or not data:
+        raise ValueError('Imagem deve ser um data URI de imagem em base64')
+    if len(data) * 3 // 4 > NEWS_IMAGE_MAX_BYTES:
+        raise ValueError(f'Imagem maior que {NEWS_IMAGE_MAX_BYTES // (1024 * 1024)} MB')
+    try:
+        return base64.b64decode(data, validate=True)
+    except binascii.Error:
+        raise ValueError('Imagem em base64 inválida')
+
+def make_variants(image_bytes):
+    """Gera as variantes em WebP de cada largura de NEWS_IMAGE_WIDTHS. Retorna {largura: bytes}."""
+    # Pillow é importado aqui para não pesar no boot dos workers que só leem o feed
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError('Arquivo de imagem inválido')
+
+    # Aplica a rotação do EXIF e descarta os metadados
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    variants = {}
+    for width in sorted(set(NEWS_IMAGE_WIDTHS)):
+        width = min(width, image.width)
+        resized = image
+        if width < image.width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format='WEBP', quality=NEWS_IMAGE_QUALITY, method=4)
+        variants[width] = buffer.getvalue()
+        if width == image.width:
+            break
+    return variants
+
+def _store_local(key, data):
+    path = os.path.join(NEWS_IMAGES_DIR, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Grava em um arquivo temporário e renomeia, para nunca servir uma imagem pela metade
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _store_s3(key, data):
+    from shared.aws import get_client
+    get_client('s3').put_object(
+        Bucket=NEWS_IMAGES_BUCKET,
+        Key=key,
+        Body=data,
+        ContentType='image/webp',
+        CacheControl='public, max-age=31536000, immutable'
+    )
+
+def store_image(key, data):
+    """Grava um arquivo no armazenamento configurado e retorna a URL pública."""
+    if NEWS_IMAGES_BACKEND == 's3':
+        _store_s3(key, data)
+    else:
+        _store_local(key, data)
+    return f'{NEWS_IMAGES_BASE_URL}/{key}'
+
+def ingest_news_image(image):
+    """
+    Converte a imagem recebida pelo CMS em URLs.
+
+    Data URIs são decodificados, redimensionados e gravados no armazenamento; as chaves
+    derivam do conteúdo, então reenviar a mesma imagem reaproveita os arquivos. URLs
+    comuns são mantidas. Retorna (url da maior variante, {largura: url}) e lança
+    ValueError se a imagem for inválida.
+    """
+    if not is_data_uri(image):
+        return image, {}
+
+    image_bytes = decode_data_uri(image)
+    digest = hashlib.sha256(image_bytes).hexdigest()[:32]
+    variants = {
+        str(width): store_image(f'news/{digest}/{width}.webp', data)
+        for width, data in make_variants(image_bytes).items()
+    }
+    largest = max(variants, key=int)
+    return variants[largest], variants
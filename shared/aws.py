@@ -0,0 +1,111 @@
+import os
+import threading
+from shared.config import load_env
+
+load_env()
+
+AWS_REGION = os.environ.get('AWS_REGION')
+
+# Cada processo mantém um pool de conexões por serviço. O tamanho deve cobrir todas as
+# threads que chamam a AWS ao mesmo tempo (threads do gunicorn + workers da fila + sweeper).
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', 2))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', 5))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+
+# Endpoints alternativos (ex.: DynamoDB Local ou MinIO em desenvolvimento)
+DYNAMODB_ENDPOINT_URL = os.environ.get('DYNAMODB_ENDPOINT_URL')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+_lock = threading.Lock()
+
+def client_config(**overrides):
+    """Configuração do botocore com pool de conexões, timeouts e retry adaptativo."""
+    from botocore.config import Config
+    options = {
+        'region_name': AWS_REGION,
+        'max_pool_connections': AWS_MAX_POOL_CONNECTIONS,
+        'connect_timeout': AWS_CONNECT_TIMEOUT,
+        'read_timeout': AWS_READ_TIMEOUT,
+        'retries': {'mode': 'adaptive', 'total_max_attempts': AWS_MAX_ATTEMPTS},
+        'tcp_keepalive': True,
+    }
+    options.update(overrides)
+    return Config(**options)
+
+def _endpoint_url(service):
+    return {'dynamodb': DYNAMODB_ENDPOINT_URL, 's3': S3_ENDPOINT_URL}.get(service)
+
+def get_session():
+    """Sessão do boto3 compartilhada pelo processo (as sessões não são seguras entre threads)."""
+    global _session
+    with _lock:
+        if _session is None:
+            # Importado aqui para que o boto3 só seja carregado quando a AWS for usada
+            import boto3
+            _session = boto3.session.Session(
+                aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+                region_name=AWS_REGION
+            )
+        return _session
+
+def get_client(service):
+    """Cliente do serviço, criado uma vez por processo e seguro para uso entre threads."""
+    client = _clients.get(service)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = session.client(service, config=client_config(), endpoint_url=_endpoint_url(service))
+                _clients[service] = client
+    return client
+
+def get_resource(service):
+    """Resource do serviço, criado uma vez por processo com a mesma configuração dos clientes."""
+    resource = _resources.get(service)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                resource = session.resource(service, config=client_config(), endpoint_url=_endpoint_url(service))
+                _resources[service] = resource
+    return resource
+
+def get_table(name):
+    """
+    Objeto Table do DynamoDB, criado uma vez por nome e reutilizado.
+
+    As operações usadas (get_item, put_item, query...) apenas repassam a chamada ao
+    cliente do resource, que é seguro entre threads e reaproveita as conexões do pool.
+    """
+    table = _tables.get(name)
+    if table is None:
+        table = get_resource('dynamodb').Table(name)
+        _tables[name] = table
+    return table
+
+# Exceções do botocore, carregadas no primeiro acesso (ex.: `except aws.ClientError`):
+# os módulos que só tratam erros da AWS não carregam o botocore ao serem importados.
+_BOTOCORE_EXCEPTIONS = ('BotoCoreError', 'ClientError')
+
+def __getattr__(name):
+    if name in _BOTOCORE_EXCEPTIONS:
+        from botocore import exceptions
+        return getattr(exceptions, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class LazyResource:
+    """Resource criado apenas no primeiro acesso a um atributo (ex.: `dynamodb.meta.client`)."""
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getattr__(self, name):
+        return getattr(get_resource(self._service), name)
@@ -0,0 +1,15 @@
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env():
+    """Carrega o .env uma única vez por processo, mesmo que vários módulos chamem."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
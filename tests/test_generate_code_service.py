@@ -0,0 +1,37 @@
+import threading
+
+from ticket_service.services.generate_code_service import CodePool, generate_code, is_valid_code
+
+
+def test_code_pool_take_concurrent():
+    # Reserva vazia e sem reabastecimento: todas as threads geram códigos na hora ao mesmo tempo
+    pool = CodePool(size=0)
+    threads_count, per_thread = 8, 500
+    codes, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(threads_count)
+
+    def worker():
+        start.wait()
+        local = []
+        try:
+            for _ in range(per_thread):
+                local.append(pool.take())
+        except Exception as e:
+            errors.append(e)
+        with lock:
+            codes.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(codes) == threads_count * per_thread
+    assert len(set(codes)) == len(codes)
+
+
+def test_generated_codes_have_valid_check_digit():
+    assert all(is_valid_code(generate_code()) for _ in range(1000))
@@ -0,0 +1,46 @@
+"""
+Índice compacto dos códigos válidos de um evento, baixado pelos leitores dos portões.
+
+Formato (big-endian):
+    cabeçalho: magic b'TIX1' (4 bytes), versão (1 byte), largura dos códigos (1 byte), quantidade (4 bytes)
+    corpo: os códigos em ASCII, ordenados, cada um completado com b'\\x00' até a largura
+
+Como os registros têm tamanho fixo e estão ordenados, o arquivo pode ser mapeado em
+memória (mmap) e consultado com busca binária, sem desserialização.
+"""
+import struct
+
+MAGIC = b'TIX1'
+VERSION = 1
+HEADER = struct.Struct('>4sBBI')
+
+def build_code_index(codes):
+    """Monta o índice binário a partir de um iterável de códigos."""
+    encoded = sorted({code.encode('ascii') for code in codes})
+    width = max((len(code) for code in encoded), default=0)
+    body = b''.join(code.ljust(width, b'\x00') for code in encoded)
+    return HEADER.pack(MAGIC, VERSION, width, len(encoded)) + body
+
+def lookup_code(index, code):
+    """Busca binária de um código em um índice (bytes, memoryview ou mmap)."""
+    magic, version, width, count = HEADER.unpack_from(index, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Índice de códigos inválido")
+
+    target = code.encode('ascii')
+    if len(target) > width:
+        return False
+    target = target.ljust(width, b'\x00')
+
+    view = memoryview(index)[HEADER.size:]
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        current = bytes(view[middle * width:(middle + 1) * width])
+        if current < target:
+            low = middle + 1
+        elif current > target:
+            high = middle
+        else:
+            return True
+    return False
@@ -1,6 +1,109 @@
-import random
+import os
+import secrets
 import string
+import threading
+from collections import deque
 
-def generate_code(length=6):
-    characters = string.ascii_uppercase + string.digits  # Letras maiúsculas e números
-    return ''.join(random.choice(characters) for _ in range(length))
+CHARACTERS = string.ascii_uppercase + string.digits  # Letras maiúsculas e números
+
+# Tamanho do código sem o dígito verificador; 36^8 ≈ 2,8 trilhões de combinações
+CODE_LENGTH = int(os.environ.get('TICKET_CODE_LENGTH', 8))
+CODE_CHECK_DIGIT = os.environ.get('TICKET_CODE_CHECK_DIGIT', 'true').lower() == 'true'
+CODE_POOL_SIZE = int(os.environ.get('TICKET_CODE_POOL_SIZE', 1000))
+
+def check_digit(body):
+    """Calcula o dígito verificador (Luhn mod 36) de um código."""
+    base = len(CHARACTERS)
+    total = 0
+    for i, char in enumerate(reversed(body)):
+        value = CHARACTERS.index(char)
+        if i % 2 == 0:
+            value *= 2
+            value = value // base + value % base
+        total += value
+    return CHARACTERS[(base - total % base) % base]
+
+def is_valid_code(code):
+    """
+    Confere, sem acessar o banco, se o código pode ter sido emitido.
+
+    Só os códigos do tamanho atual (CODE_LENGTH mais o dígito verificador) têm o dígito
+    conferido; os de outros tamanhos, como os antigos de 6 caracteres sem dígito, passam
+    apenas pela checagem do alfabeto.
+    """
+    if not code or any(char not in CHARACTERS for char in code):
+        return False
+    if len(code) != CODE_LENGTH + 1:
+        return True
+    return check_digit(code[:-1]) == code[-1]
+
+def generate_code(length=CODE_LENGTH, with_check_digit=CODE_CHECK_DIGIT):
+    """Gera um código aleatório com `secrets`, opcionalmente seguido do dígito verificador."""
+    body = ''.join(secrets.choice(CHARACTERS) for _ in range(length))
+    return body + check_digit(body) if with_check_digit else body
+
+class CodePool:
+    """
+    Reserva de códigos pré-gerados e sem repetição, reabastecida em segundo plano.
+
+    `generator` permite trocar a estratégia de geração (tamanho, alfabeto, etc.).
+    Os códigos já entregues por este processo são lembrados para não serem repetidos.
+    """
+
+    def __init__(self, generator=generate_code, size=CODE_POOL_SIZE, remember=100000):
+        self.generator = generator
+        self.size = size
+        self._codes = deque()
+        self._known = set()
+        self._issued = deque(maxlen=remember)
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._refiller = None
+
+    def _add_code(self):
+        # Deve ser chamada com o lock adquirido
+        code = self.generator()
+        if code not in self._known:
+            self._known.add(code)
+            self._codes.append(code)
+
+    def _fill(self, target):
+        while True:
+            with self._lock:
+                if len(self._codes) >= target:
+                    return
+                self._add_code()
+
+    def _refill_loop(self):
+        while True:
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+            self._fill(self.size)
+
+    def take(self):
+        """Retira um código da reserva, gerando na hora se ela estiver vazia."""
+        if self._refiller is None:
+            with self._lock:
+                if self._refiller is None:
+                    self._refiller = threading.Thread(target=self._refill_loop, name='code-pool-refill', daemon=True)
+                    self._refiller.start()
+
+        with self._lock:
+            # Gera na hora sem soltar o lock, para que outra thread não esvazie a reserva antes do popleft
+            while not self._codes:
+                self._add_code()
+            code = self._codes.popleft()
+            # Mantém em _known apenas os códigos na reserva e os últimos entregues
+            if len(self._issued) == self._issued.maxlen:
+                self._known.discard(self._issued[0])
+            self._issued.append(code)
+            low = len(self._codes) < self.size // 2
+        if low:
+            self._refill_needed.set()
+        return code
+
+_pool = CodePool()
+
+def next_code():
+    """Próximo código da reserva global do processo."""
+    return _pool.take()
@@ -1,28 +1,266 @@
-import qrcode
+import io
+import multiprocessing
 import os
-from dotenv import load_dotenv
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from ticket_service.utils.cache import SizedLRUCache
+from shared.config import load_env
 
-load_dotenv()
+load_env()
 
-DIRETORIO = os.environ['ASSETS_PATH']
+DIRETORIO = os.environ.get('ASSETS_PATH', 'assets')
 
-def generate_qr_code(ticket_code, output_dir=DIRETORIO):
-    os.makedirs(output_dir, exist_ok=True)
-    
-    qr_code_file = os.path.join(output_dir, f'{ticket_code}.png')
+# Limite de memória das imagens renderizadas mantidas em cache
+QR_CACHE_MAX_BYTES = int(os.environ.get('QR_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Processos usados na renderização em lote (exportações e pedidos grandes)
+QR_EXPORT_WORKERS = int(os.environ.get('QR_EXPORT_WORKERS', os.cpu_count() or 1))
+# Códigos enviados a cada processo por tarefa; lotes menores que isso são renderizados aqui mesmo
+QR_EXPORT_CHUNK = int(os.environ.get('QR_EXPORT_CHUNK', 64))
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
 
+_render_cache = SizedLRUCache(QR_CACHE_MAX_BYTES)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def _make_qr(ticket_code, box_size=10, border=4, image_factory=None):
+    # qrcode (e o Pillow, usado para o PNG) só são carregados quando um QR Code é gerado
+    import qrcode
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
+        box_size=box_size,
+        border=border,
+        image_factory=image_factory,
     )
-    
     qr.add_data(ticket_code)
     qr.make(fit=True)
+    return qr
+
+def _render(ticket_code, fmt, box_size, border):
+    if fmt == 'svg':
+        import qrcode.image.svg
+        qr = _make_qr(ticket_code, box_size, border, qrcode.image.svg.SvgPathImage)
+    else:
+        qr = _make_qr(ticket_code, box_size, border)
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image().save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def render_qr_code(ticket_code, fmt='png', box_size=10, border=4):
+    """
+    Renderiza o QR Code do ingresso em memória e retorna os bytes da imagem (PNG ou SVG).
 
-    img = qr.make_image(fill_color="black", back_color="white")
-    img.save(qr_code_file)
+    Imagens iguais (mesmo código e estilo) são servidas de um cache LRU limitado por tamanho.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato não suportado: {fmt}")
+
+    key = (ticket_code, fmt, box_size, border)
+    image = _render_cache.get(key)
+    if image is None:
+        image = _render(ticket_code, fmt, box_size, border)
+        _render_cache.set(key, image)
+    return image
+
+def generate_qr_code(ticket_code, output_dir=DIRETORIO):
+    os.makedirs(output_dir, exist_ok=True)
+    
+    qr_code_file = os.path.join(output_dir, f'{ticket_code}.png')
+
+    with open(qr_code_file, 'wb') as f:
+        f.write(render_qr_code(ticket_code))
 
     return qr_code_file  # Retorna o caminho do arquivo gerado
 
+
+def _render_chunk(codes, fmt, box_size, border):
+    # Executada nos processos do pool; o cache LRU de cada processo não é usado aqui
+    return [_render(code, fmt, box_size, border) for code in codes]
+
+def _matrix_chunk(codes, border):
+    """Matriz de módulos de cada código, empacotada em 1 bit por módulo (0 = preto)."""
+    result = []
+    for code in codes:
+        matrix = _make_qr(code, border=border).get_matrix()
+        row_bytes = (len(matrix) + 7) // 8
+        data = bytearray()
+        for row in matrix:
+            bits = 0
+            for dark in row:
+                bits = (bits << 1) | (0 if dark else 1)
+            bits <<= row_bytes * 8 - len(row)
+            data += bits.to_bytes(row_bytes, 'big')
+        result.append((len(matrix), bytes(data)))
+    return result
+
+def _get_executor(workers):
+    # Processos iniciados com "spawn" para não herdar as threads do servidor
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executors[workers] = executor
+        return executor
+
+def _parallel(func, codes, args, workers):
+    """
+    Aplica `func` aos códigos em blocos de QR_EXPORT_CHUNK, distribuídos entre `workers` processos.
+
+    Os resultados saem na ordem dos códigos. Apenas algumas rodadas de blocos ficam em
+    andamento por vez, para que a memória não cresça com o tamanho da exportação.
+    """
+    workers = workers or QR_EXPORT_WORKERS
+    chunks = [codes[i:i + QR_EXPORT_CHUNK] for i in range(0, len(codes), QR_EXPORT_CHUNK)]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from func(chunk, *args)
+        return
+
+    executor = _get_executor(workers)
+    window = workers * 4
+    for start in range(0, len(chunks), window):
+        futures = [executor.submit(func, chunk, *args) for chunk in chunks[start:start + window]]
+        for future in futures:
+            yield from future.result()
+
+def render_qr_codes(codes, fmt='png', box_size=10, border=4, workers=None):
+    """
+    Renderiza vários QR Codes em paralelo, gerando pares (código, bytes da imagem) na ordem recebida.
+
+    O trabalho do qrcode e do Pillow usa CPU, por isso é distribuído entre processos
+    (QR_EXPORT_WORKERS por padrão).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato não suportado: {fmt}")
+    codes = list(codes)
+    return zip(codes, _parallel(_render_chunk, codes, (fmt, box_size, border), workers))
+
+class _ZipStream:
+    """Arquivo somente de escrita cujo conteúdo é recolhido em partes pelo gerador do ZIP."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def stream_qr_zip(codes, fmt='png', workers=None):
+    """
+    Gera, em partes, um ZIP com o QR Code de cada código (`<código>.<fmt>`).
+
+    As imagens já são comprimidas, então vão sem compressão; o ZIP é escrito
+    sequencialmente e pode ser enviado enquanto os QR Codes são renderizados.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for code, image in render_qr_codes(codes, fmt, workers=workers):
+            archive.writestr(f'{code}.{fmt}', image)
+            yield stream.drain()
+    yield stream.drain()
+
+# Página A4 em pontos, com uma grade de 3 x 4 QR Codes e o código impresso abaixo de cada um
+PDF_PAGE_SIZE = (595, 842)
+PDF_GRID = (3, 4)
+PDF_QR_SIZE = 150
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def stream_qr_pdf(codes, workers=None):
+    """
+    Gera, em partes, um PDF de várias páginas com os QR Codes em grade, prontos para impressão.
+
+    Cada QR Code entra no PDF como uma imagem de 1 bit por módulo, ampliada pelo próprio
+    leitor de PDF; assim o arquivo fica pequeno e nenhuma página precisa ser guardada em memória.
+    """
+    codes = list(codes)
+    width, height = PDF_PAGE_SIZE
+    columns, rows = PDF_GRID
+    per_page = columns * rows
+    cell_w, cell_h = width / columns, height / rows
+
+    offsets = [0, 0, 0, 0]  # objetos 1 (catálogo), 2 (páginas) e 3 (fonte) são fixos
+    position = 0
+    page_refs = []
+
+    def emit(body, number=None):
+        nonlocal position
+        if number is None:
+            number = len(offsets)
+            offsets.append(0)
+        offsets[number] = position
+        data = f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        position += len(data)
+        return number, data
+
+    def emit_stream(header, data):
+        return emit(f'<< {header} /Length {len(data)} >>\nstream\n'.encode() + data + b'\nendstream')
+
+    out = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(out)
+    _, data = emit(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>', 3)
+    yield out + data
+
+    matrices = _parallel(_matrix_chunk, codes, (4,), workers)
+    for page_start in range(0, len(codes), per_page):
+        page_codes = codes[page_start:page_start + per_page]
+        parts = []
+        images = []
+        content = []
+        for index, code in enumerate(page_codes):
+            modules, bits = next(matrices)
+            number, data = emit_stream(
+                f'/Type /XObject /Subtype /Image /Width {modules} /Height {modules} '
+                f'/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode',
+                zlib.compress(bits)
+            )
+            parts.append(data)
+            images.append(f'/Q{index} {number} 0 R')
+
+            column, row = index % columns, index // columns
+            x = column * cell_w + (cell_w - PDF_QR_SIZE) / 2
+            y = height - (row + 1) * cell_h + (cell_h - PDF_QR_SIZE) / 2 + 10
+            content.append(f'q {PDF_QR_SIZE} 0 0 {PDF_QR_SIZE} {x:.2f} {y:.2f} cm /Q{index} Do Q')
+            content.append(f'BT /F1 11 Tf {x + PDF_QR_SIZE / 2 - len(code) * 3.3:.2f} {y - 6:.2f} Td ({_pdf_escape(code)}) Tj ET')
+
+        content_number, data = emit_stream('/Filter /FlateDecode', zlib.compress('\n'.join(content).encode()))
+        parts.append(data)
+        page_number, data = emit(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] '
+            f'/Resources << /Font << /F1 3 0 R >> /XObject << {" ".join(images)} >> >> '
+            f'/Contents {content_number} 0 R >>'.encode()
+        )
+        parts.append(data)
+        page_refs.append(page_number)
+        yield b''.join(parts)
+
+    kids = ' '.join(f'{number} 0 R' for number in page_refs)
+    _, pages = emit(f'<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>'.encode(), 2)
+    _, catalog = emit(b'<< /Type /Catalog /Pages 2 0 R >>', 1)
+
+    xref_position = position
+    xref = [f'xref\n0 {len(offsets)}\n', '0000000000 65535 f \n']
+    xref += [f'{offset:010d} 00000 n \n' for offset in offsets[1:]]
+    trailer = f'trailer\n<< /Size {len(offsets)} /Root 1 0 R >>\nstartxref\n{xref_position}\n%%EOF\n'
+    yield pages + catalog + ''.join(xref).encode() + trailer.encode()
@@ -0,0 +1,139 @@
+import json
+from decimal import Decimal
+from ticket_service.utils.cache import TTLCache
+from ticket_service.utils.db import (
+    ADMIN_ID, store_tickets_batch, update_admin_balance, credit_payment_balance,
+    get_processed_payment, claim_payment, release_payment_claim, complete_payment
+)
+from ticket_service.utils.inventory import resolve_lot_id, reserve_lot, confirm_reservation, release_reservation
+from ticket_service.services.generate_code_service import next_code
+from ticket_service.services.process_payment import get_payment_details
+
+# Pagamentos com estado final conhecido; entregas repetidas do webhook param aqui
+_processed_payments = TTLCache(maxsize=10000, ttl=3600)
+
+def issue_tickets(event_id, name, email, cpf, user_id, quantity, price, lot, payment_id=None):
+    """
+    Emite os ingressos de um pedido e credita o saldo do administrador.
+
+    Usada tanto pela rota /generate_ticket quanto pelo webhook, sem passar por HTTP.
+    Com `payment_id`, o progresso fica no ledger do pagamento: uma nova tentativa emite
+    apenas os ingressos que faltam e o saldo é creditado uma única vez, com o pedido completo.
+
+    :return: {"success": True, "tickets": [...]} ou {"success": False, "error": ..., "tickets": [...]}
+    """
+    price = Decimal(str(price))
+    if payment_id is None:
+        codes = store_tickets_batch(event_id, quantity, name, email, cpf, user_id, price, lot, next_code)
+        if codes:
+            # Atualiza o saldo do administrador uma única vez por pedido
+            update_admin_balance(ADMIN_ID, price * len(codes))
+    else:
+        record = get_processed_payment(payment_id, consistent_read=True) or {}
+        codes = list(record.get('codes', []))
+        codes += store_tickets_batch(event_id, quantity - len(codes), name, email, cpf, user_id, price, lot,
+                                     next_code, payment_id=payment_id)
+        if len(codes) >= quantity and not record.get('credited'):
+            credit_payment_balance(ADMIN_ID, payment_id, price * len(codes))
+
+    tickets = [{'code': code} for code in codes]
+    if len(codes) < quantity:
+        return {"success": False, "error": "Código já existente", "tickets": tickets}
+    return {"success": True, "tickets": tickets}
+
+def _confirm_order_reservation(payment_id, custom_data):
+    """
+    Confirma a reserva do pedido aprovado.
+
+    Se a reserva já tiver expirado, tenta reservar o estoque novamente com um ID derivado
+    do pagamento, então uma nova tentativa confirma essa mesma reserva em vez de baixar o
+    estoque outra vez. O pagamento aprovado é honrado mesmo que o lote tenha esgotado.
+    """
+    reservation_id = custom_data.get("reservation_id")
+    if reservation_id and confirm_reservation(reservation_id):
+        return
+
+    lot_id = resolve_lot_id(custom_data["lot"])
+    reservation_id = reserve_lot(
+        lot_id, int(custom_data["quantity"]), reservation_id=f"payment-{payment_id}"
+    ) if lot_id is not None else None
+    if reservation_id:
+        confirm_reservation(reservation_id)
+    else:
+        print(f"Aviso: lote {custom_data['lot']} sem estoque para um pagamento aprovado, emitindo mesmo assim")
+
+def is_payment_processed(payment_id):
+    """Indica, sem acessar a rede, se o pagamento já foi processado por este processo."""
+    return _processed_payments.get(str(payment_id)) is not None
+
+def process_payment_notification(payment_id):
+    """
+    Processa uma notificação de pagamento do Mercado Pago retirada da fila de webhooks.
+
+    Pagamentos já registrados no ledger são ignorados antes de consultar o Mercado Pago.
+    Exceções são propagadas para que a fila tente novamente mais tarde; nesse caso o
+    pagamento continua em 'processing' e a nova tentativa retoma a emissão do ponto em
+    que parou.
+    """
+    payment_id = str(payment_id)
+    if is_payment_processed(payment_id):
+        return None
+
+    record = get_processed_payment(payment_id)
+    if record and record["status"] != "processing":
+        _processed_payments.set(payment_id, record["status"])
+        return None
+
+    payment_details = get_payment_details(payment_id)
+    print("Detalhes do pagamento:", payment_details)  # Log para debug
+
+    external_reference = payment_details.get("external_reference")
+    if not external_reference:
+        print(f"Pagamento {payment_id} sem external_reference, ignorando.")
+        return None
+
+    custom_data = json.loads(external_reference)
+
+    # Processa o status do pagamento
+    status = payment_details.get("status")
+    if status == "approved":
+        if not claim_payment(payment_id):
+            raise Exception("Pagamento já está sendo processado por outro worker")
+
+        try:
+            # Numa retomada com ingressos já emitidos, a reserva já foi confirmada
+            if not (record and record.get("codes")):
+                _confirm_order_reservation(payment_id, custom_data)
+
+            print("Pagamento aprovado! Gerando ingresso...")
+            result = issue_tickets(
+                event_id=custom_data["event_id"],
+                name=custom_data["name"],
+                email=payment_details["payer"]["email"],
+                cpf=payment_details["payer"]["identification"]["number"],
+                user_id=custom_data["user_id"],
+                quantity=custom_data["quantity"],
+                price=custom_data["price"],
+                lot=custom_data["lot"],
+                payment_id=payment_id
+            )
+            if not result["success"]:
+                raise Exception(f"Erro ao gerar ingresso do pagamento {payment_id}: {result['error']}")
+        except Exception:
+            # Libera o pagamento para que a próxima tentativa da fila o retome sem esperar
+            release_payment_claim(payment_id)
+            raise
+        complete_payment(payment_id, "issued")
+        _processed_payments.set(payment_id, "issued")
+        return result
+    elif status in ["in_process", "pending"]:
+        # Ainda pode ser aprovado, então não entra no ledger
+        print("Pagamento em processamento...")
+    else:
+        print(f"Pagamento não aprovado. Status: {status}")
+        if custom_data.get("reservation_id"):
+            # Devolve os ingressos reservados ao estoque do lote
+            release_reservation(custom_data["reservation_id"])
+        complete_payment(payment_id, status)
+        _processed_payments.set(payment_id, status)
+    return None
@@ -1,30 +1,46 @@
-import mercadopago
 import os
-from dotenv import load_dotenv
+import threading
 import uuid
 import hashlib
 import hmac
+from shared.config import load_env
 
 # Carrega as variáveis de ambiente
-load_dotenv()
+load_env()
 
 # Configura o SDK do Mercado Pago
 MP_ACCESS_TOKEN = os.environ.get("MP_ACCESS_TOKEN")
 MP_CLIENT_ID = os.environ.get("MP_CLIENT_ID")
 if not MP_ACCESS_TOKEN:
     raise ValueError("MP_ACCESS_TOKEN não está configurado.")
-sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+
+_sdk = None
+_sdk_lock = threading.Lock()
+
+def get_sdk():
+    """SDK do Mercado Pago, importado e criado no primeiro pagamento do processo."""
+    global _sdk
+    if _sdk is None:
+        with _sdk_lock:
+            if _sdk is None:
+                import mercadopago
+                _sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+    return _sdk
+
+def _request_options():
+    from mercadopago.config import RequestOptions
+    return RequestOptions()
 
 def process_payment(payment_data):
     try:
-        request_options = mercadopago.config.RequestOptions()
+        request_options = _request_options()
         request_options.custom_headers = {
             "x-idempotency-key": str(uuid.uuid4()),
         }
 
 
         print("Enviando dados para o Mercado Pago:", payment_data)  # Log dos dados enviados
-        payment_response = sdk.payment().create(payment_data, request_options)
+        payment_response = get_sdk().payment().create(payment_data, request_options)
 
         print("Resposta bruta do Mercado Pago:", payment_response)  # Log da resposta completa
 
@@ -54,7 +70,7 @@ def process_payment(payment_data):
 def get_payment_details(payment_id):
     try:
         # Usa o SDK do Mercado Pago para buscar os detalhes do pagamento
-        payment_response = sdk.payment().get(payment_id)
+        payment_response = get_sdk().payment().get(payment_id)
         print("Resposta da API do Mercado Pago:", payment_response)  # Log para debug
 
         # Verifica se a resposta foi bem-sucedida
@@ -75,13 +91,13 @@ def process_payment_pix(payment_data):
     """
     try:
         # Configura a chave de idempotência
-        request_options = mercadopago.config.RequestOptions()
+        request_options = _request_options()
         request_options.custom_headers = {
             "x-idempotency-key": str(uuid.uuid4())
         }
 
         # Cria a cobrança PIX
-        payment_response = sdk.payment().create({
+        pix_payment = {
             "transaction_amount": float(payment_data["transaction_amount"]),
             "payment_method_id": "pix",
             "payer": {
@@ -94,7 +110,11 @@ def process_payment_pix(payment_data):
                 }
             },
             "external_reference": payment_data["external_reference"]  # Referência externa
-        }, request_options)
+        }
+        if payment_data.get("date_of_expiration"):
+            # Expiração do PIX alinhada com a reserva dos ingressos
+            pix_payment["date_of_expiration"] = payment_data["date_of_expiration"]
+        payment_response = get_sdk().payment().create(pix_payment, request_options)
         print(payment_response)  # Log para depuração
 
         # Verifica a resposta do pagamento
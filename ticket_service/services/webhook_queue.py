@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+from shared.config import load_env
+
+load_env()
+
+# Journal local das notificações de pagamento pendentes, por padrão no diretório de dados
+WEBHOOK_QUEUE_DATABASE = os.environ.get('WEBHOOK_QUEUE_DATABASE', os.path.join('data', 'webhook_queue.db'))
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 8))
+
+# Tempo que um job fica reservado para um worker antes de voltar para a fila
+LEASE_SECONDS = 300
+POLL_INTERVAL = 1.0
+
+_wakeup = threading.Event()
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+def _connect():
+    conn = sqlite3.connect(WEBHOOK_QUEUE_DATABASE, timeout=30, isolation_level=None)
+    # Em WAL, NORMAL sobrevive a reinícios do processo sem um fsync por notificação
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def init_webhook_queue():
+    """Cria o journal da fila de webhooks se não existir."""
+    directory = os.path.dirname(WEBHOOK_QUEUE_DATABASE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = _connect()
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payment_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_webhook_jobs_status
+            ON webhook_jobs (status, available_at)
+        ''')
+    finally:
+        conn.close()
+
+def enqueue_payment(payment_id):
+    """
+    Grava a notificação no journal e acorda os workers.
+
+    Notificações repetidas de um pagamento que ainda aguarda processamento são agrupadas em um único job.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute('''
+            INSERT INTO webhook_jobs (payment_id, status, available_at, created_at)
+            SELECT ?, 'pending', ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM webhook_jobs WHERE payment_id = ? AND status = 'pending'
+            )
+        ''', (str(payment_id), now, now, str(payment_id)))
+    finally:
+        conn.close()
+    _wakeup.set()
+
+def _claim_job():
+    """Reserva o próximo job disponível, incluindo jobs cuja reserva expirou."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('''
+            SELECT id, payment_id, attempts FROM webhook_jobs
+            WHERE status IN ('pending', 'processing') AND available_at <= ?
+            ORDER BY id LIMIT 1
+        ''', (now,)).fetchone()
+        if row:
+            conn.execute('''
+                UPDATE webhook_jobs SET status = 'processing', attempts = attempts + 1, available_at = ?
+                WHERE id = ?
+            ''', (now + LEASE_SECONDS, row[0]))
+        conn.execute('COMMIT')
+        return (row[0], row[1], row[2] + 1) if row else None
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def _complete_job(job_id):
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM webhook_jobs WHERE id = ?', (job_id,))
+    finally:
+        conn.close()
+
+def _fail_job(job_id, attempts, error):
+    """Reagenda o job com backoff exponencial ou o marca como falho."""
+    if attempts >= WEBHOOK_MAX_ATTEMPTS:
+        status, available_at = 'failed', time.time()
+    else:
+        status, available_at = 'pending', time.time() + min(2 ** attempts, 300)
+
+    conn = _connect()
+    try:
+        conn.execute('''
+            UPDATE webhook_jobs SET status = ?, available_at = ?, last_error = ?
+            WHERE id = ?
+        ''', (status, available_at, error, job_id))
+    finally:
+        conn.close()
+
+def _worker_loop(handler):
+    while True:
+        try:
+            job = _claim_job()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler a fila de webhooks: {e}")
+            job = None
+
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        job_id, payment_id, attempts = job
+        try:
+            handler(payment_id)
+            _complete_job(job_id)
+        except Exception as e:
+            print(f"Erro ao processar pagamento {payment_id} (tentativa {attempts}): {e}")
+            _fail_job(job_id, attempts, str(e))
+
+def start_webhook_workers(handler, num_workers=WEBHOOK_WORKERS):
+    """
+    Inicia as threads que consomem a fila neste processo. Chamadas repetidas não criam novos workers.
+
+    Um processo criado por fork (gunicorn --preload) herda a lista, mas não as threads,
+    então os workers são iniciados de novo quando o pid muda.
+    """
+    global _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers.clear()
+        for i in range(num_workers):
+            worker = threading.Thread(target=_worker_loop, args=(handler,), name=f'webhook-worker-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+        _workers_pid = os.getpid()
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """Cache LRU em memória com expiração por tempo, seguro para uso entre threads."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Retorna o valor da chave ou `default` se ausente ou expirado."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Armazena o valor, descartando a entrada menos usada se o cache estiver cheio."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Remove uma chave, ou todo o conteúdo quando nenhuma chave é informada."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+class SizedLRUCache:
+    """Cache LRU de valores em bytes limitado pelo tamanho total armazenado, seguro para uso entre threads."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Armazena o valor; itens maiores que o limite total não são guardados."""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self._data[key] = value
+            self.current_bytes += len(value)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.current_bytes -= len(evicted)
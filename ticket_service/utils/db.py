@@ -1,29 +1,129 @@
 import os
-import boto3
-from botocore.exceptions import ClientError, WaiterError
-from dotenv import load_dotenv
-from decimal import Decimal
+import json
+import base64
+from decimal import Decimal, InvalidOperation
 import uuid
+import time
+from datetime import datetime, timezone
+import threading
+import random
+from ticket_service.utils.cache import TTLCache
+from shared import aws
+from shared.aws import LazyResource, get_table
+from shared.config import load_env
 
-load_dotenv()
+load_env()
 
-# Configurações do DynamoDB
-AWS_ACCESS_KEY_ID = os.environ['AWS_ACCESS_KEY_ID']
-AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
-AWS_REGION = os.environ['AWS_REGION']
-
-# Inicializa o cliente do DynamoDB
-dynamodb = boto3.resource(
-    'dynamodb',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+# Resource do DynamoDB compartilhado pelo processo, com pool de conexões e retry adaptativo.
+# É criado no primeiro uso, para não atrasar o boot de workers que não acessam o DynamoDB.
+dynamodb = LazyResource('dynamodb')
 
 # Nomes das tabelas
 TICKETS_TABLE = 'tickets'
 LOTES_TABLE = 'lotes'
 VALIDATED_TICKETS_TABLE = 'validated_tickets'
+PROCESSED_PAYMENTS_TABLE = 'processed_payments'
+COUNTERS_TABLE = 'counters'
+RESERVATIONS_TABLE = 'reservations'
+LOTE_SHARDS_TABLE = 'lote_shards'
+WITHDRAWALS_TABLE = 'admin_withdrawals'
+
+ALL_TABLES = (
+    TICKETS_TABLE, LOTES_TABLE, VALIDATED_TICKETS_TABLE, PROCESSED_PAYMENTS_TABLE,
+    COUNTERS_TABLE, RESERVATIONS_TABLE, LOTE_SHARDS_TABLE, WITHDRAWALS_TABLE
+)
+
+# As tabelas são criadas por `python manage.py provision`. Em tempo de execução:
+# 'lazy' confere uma vez por processo se elas existem, 'create' cria as que faltarem
+# (desenvolvimento) e 'off' não faz nenhuma chamada ao plano de controle.
+DYNAMODB_TABLE_CHECK = os.environ.get('DYNAMODB_TABLE_CHECK', 'lazy')
+
+# Índice secundário global para consultar os tickets de um usuário
+USER_TICKETS_INDEX = 'user_id-event_id-index'
+
+# Índice dos tickets validados por evento e horário de validação, usado na sincronização das catracas
+VALIDATED_AT_INDEX = 'event_id-validated_at-index'
+
+# Índice das reservas por estado e expiração, usado para liberar reservas vencidas
+RESERVATIONS_EXPIRY_INDEX = 'status-expires_at-index'
+
+# ID do administrador que recebe o saldo das vendas
+ADMIN_ID = os.environ.get('ADMIN_ID', '7b87fd15-bea4-4fff-9033-9224fc0c8a01')
+
+# O saldo do administrador é dividido em vários itens para não concentrar as escritas em uma chave.
+# Reduzir este valor exige compactar o saldo antes, para não deixar shards fora da soma.
+ADMIN_BALANCE_SHARDS = int(os.environ.get('ADMIN_BALANCE_SHARDS', 10))
+
+# Cache da listagem de lotes. LOTES_CACHE_STAMP aponta para um arquivo (ex.: em /dev/shm)
+# cuja data de modificação propaga invalidações entre os workers da mesma máquina.
+LOTES_CACHE_TTL = float(os.environ.get('LOTES_CACHE_TTL', 5))
+LOTES_CACHE_STAMP = os.environ.get('LOTES_CACHE_STAMP')
+
+_lotes_cache = TTLCache(maxsize=1, ttl=LOTES_CACHE_TTL)
+_lotes_load_lock = threading.Lock()
+
+_missing_tables = None
+_tables_check_lock = threading.Lock()
+
+# Limite de ações por chamada TransactWriteItems
+TRANSACT_MAX_ITEMS = 100
+
+def _user_tickets_index_definition():
+    return {
+        'IndexName': USER_TICKETS_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'event_id', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'ALL'},
+        'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+    }
+
+def _ensure_user_tickets_index():
+    """Adiciona o índice de tickets por usuário a uma tabela de tickets existente."""
+    description = dynamodb.meta.client.describe_table(TableName=TICKETS_TABLE)['Table']
+    indexes = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    if USER_TICKETS_INDEX in indexes:
+        return
+
+    # O preenchimento do índice continua em segundo plano; get_user_tickets usa scan até ele ficar ativo
+    dynamodb.meta.client.update_table(
+        TableName=TICKETS_TABLE,
+        AttributeDefinitions=[
+            {'AttributeName': 'user_id', 'AttributeType': 'S'},
+            {'AttributeName': 'event_id', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': _user_tickets_index_definition()}]
+    )
+
+def _validated_at_index_definition():
+    return {
+        'IndexName': VALIDATED_AT_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'event_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'validated_at', 'KeyType': 'RANGE'}
+        ],
+        # A chave da tabela (event_id, code) sempre faz parte da projeção
+        'Projection': {'ProjectionType': 'KEYS_ONLY'},
+        'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+    }
+
+def _ensure_validated_at_index():
+    """Adiciona o índice por horário de validação a uma tabela de tickets validados existente."""
+    description = dynamodb.meta.client.describe_table(TableName=VALIDATED_TICKETS_TABLE)['Table']
+    indexes = [index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])]
+    if VALIDATED_AT_INDEX in indexes:
+        return
+
+    # Enquanto o índice é preenchido, get_validated_codes_since usa a consulta com filtro
+    dynamodb.meta.client.update_table(
+        TableName=VALIDATED_TICKETS_TABLE,
+        AttributeDefinitions=[
+            {'AttributeName': 'event_id', 'AttributeType': 'S'},
+            {'AttributeName': 'validated_at', 'AttributeType': 'N'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': _validated_at_index_definition()}]
+    )
 
 def ensure_table_exists():
     """Cria as tabelas se não existirem."""
@@ -37,15 +137,19 @@ def ensure_table_exists():
             ],
             AttributeDefinitions=[
                 {'AttributeName': 'event_id', 'AttributeType': 'S'},
-                {'AttributeName': 'code', 'AttributeType': 'S'}
+                {'AttributeName': 'code', 'AttributeType': 'S'},
+                {'AttributeName': 'user_id', 'AttributeType': 'S'}
             ],
+            GlobalSecondaryIndexes=[_user_tickets_index_definition()],
             ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
         )
         waiter = dynamodb.meta.client.get_waiter('table_exists')
         waiter.wait(TableName=TICKETS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
-    except ClientError as e:
+    except aws.ClientError as e:
         if e.response['Error']['Code'] != 'ResourceInUseException':
             raise
+        # Tabelas criadas antes do índice recebem o GSI via update_table
+        _ensure_user_tickets_index()
 
     try:
         # Tabela de lotes
@@ -61,7 +165,7 @@ def ensure_table_exists():
         )
         waiter = dynamodb.meta.client.get_waiter('table_exists')
         waiter.wait(TableName=LOTES_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
-    except ClientError as e:
+    except aws.ClientError as e:
         if e.response['Error']['Code'] != 'ResourceInUseException':
             raise
     try:
@@ -78,7 +182,7 @@ def ensure_table_exists():
         )
         waiter = dynamodb.meta.client.get_waiter('table_exists')
         waiter.wait(TableName='admin_balance', WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
-    except ClientError as e:
+    except aws.ClientError as e:
         if e.response['Error']['Code'] != 'ResourceInUseException':
             raise
 
@@ -92,19 +196,160 @@ def ensure_table_exists():
             ],
             AttributeDefinitions=[
                 {'AttributeName': 'event_id', 'AttributeType': 'S'},
-                {'AttributeName': 'code', 'AttributeType': 'S'}
+                {'AttributeName': 'code', 'AttributeType': 'S'},
+                {'AttributeName': 'validated_at', 'AttributeType': 'N'}
             ],
+            GlobalSecondaryIndexes=[_validated_at_index_definition()],
             ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
         )
         waiter = dynamodb.meta.client.get_waiter('table_exists')
         waiter.wait(TableName=VALIDATED_TICKETS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
-    except ClientError as e:
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+        _ensure_validated_at_index()
+
+    try:
+        # Ledger de pagamentos já processados pelo webhook
+        dynamodb.create_table(
+            TableName=PROCESSED_PAYMENTS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'payment_id', 'KeyType': 'HASH'}  # Partition key
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'payment_id', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+        waiter = dynamodb.meta.client.get_waiter('table_exists')
+        waiter.wait(TableName=PROCESSED_PAYMENTS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+
+    try:
+        # Tabela de contadores atômicos (IDs sequenciais)
+        dynamodb.create_table(
+            TableName=COUNTERS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'name', 'KeyType': 'HASH'}  # Partition key
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'name', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+        waiter = dynamodb.meta.client.get_waiter('table_exists')
+        waiter.wait(TableName=COUNTERS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+
+    try:
+        # Tabela de reservas de ingressos dos lotes
+        dynamodb.create_table(
+            TableName=RESERVATIONS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'reservation_id', 'KeyType': 'HASH'}  # Partition key
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'reservation_id', 'AttributeType': 'S'},
+                {'AttributeName': 'status', 'AttributeType': 'S'},
+                {'AttributeName': 'expires_at', 'AttributeType': 'N'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': RESERVATIONS_EXPIRY_INDEX,
+                'KeySchema': [
+                    {'AttributeName': 'status', 'KeyType': 'HASH'},
+                    {'AttributeName': 'expires_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'KEYS_ONLY'},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+            }],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+        waiter = dynamodb.meta.client.get_waiter('table_exists')
+        waiter.wait(TableName=RESERVATIONS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+
+    try:
+        # Estoque dos lotes com contador particionado (lotes muito disputados)
+        dynamodb.create_table(
+            TableName=LOTE_SHARDS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'lot_id', 'KeyType': 'HASH'},  # Partition key
+                {'AttributeName': 'shard', 'KeyType': 'RANGE'}    # Sort key
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'lot_id', 'AttributeType': 'N'},
+                {'AttributeName': 'shard', 'AttributeType': 'N'}
+            ],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+        waiter = dynamodb.meta.client.get_waiter('table_exists')
+        waiter.wait(TableName=LOTE_SHARDS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceInUseException':
+            raise
+
+    try:
+        # Ledger de saques, um item por solicitação
+        dynamodb.create_table(
+            TableName=WITHDRAWALS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'admin_id', 'KeyType': 'HASH'},      # Partition key
+                {'AttributeName': 'withdrawal_id', 'KeyType': 'RANGE'}  # Sort key (data da solicitação)
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'admin_id', 'AttributeType': 'S'},
+                {'AttributeName': 'withdrawal_id', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+        )
+        waiter = dynamodb.meta.client.get_waiter('table_exists')
+        waiter.wait(TableName=WITHDRAWALS_TABLE, WaiterConfig={'Delay': 2, 'MaxAttempts': 10})
+    except aws.ClientError as e:
         if e.response['Error']['Code'] != 'ResourceInUseException':
             raise
 
+def missing_tables():
+    """Tabelas do serviço que ainda não existem, consultadas com list_tables."""
+    existing = set()
+    for page in dynamodb.meta.client.get_paginator('list_tables').paginate():
+        existing.update(page['TableNames'])
+    return [name for name in ALL_TABLES if name not in existing]
+
+def check_tables_once():
+    """
+    Confere as tabelas na primeira chamada do processo e guarda o resultado.
+
+    Não espera por waiters: tabelas ausentes apenas geram um aviso (ou são criadas no
+    modo 'create'). Retorna a lista de tabelas que faltavam.
+    """
+    global _missing_tables
+    if _missing_tables is not None or DYNAMODB_TABLE_CHECK == 'off':
+        return _missing_tables or []
+
+    with _tables_check_lock:
+        if _missing_tables is None:
+            try:
+                missing = missing_tables()
+                if missing and DYNAMODB_TABLE_CHECK == 'create':
+                    ensure_table_exists()
+                elif missing:
+                    print(f"Tabelas ausentes no DynamoDB: {', '.join(missing)}. Execute `python manage.py provision`.")
+            except (aws.ClientError, aws.BotoCoreError) as e:
+                # Sem permissão para listar as tabelas ou sem conexão; não tenta de novo neste processo
+                print(f"Erro ao verificar as tabelas do DynamoDB: {e}")
+                missing = []
+            _missing_tables = missing
+    return _missing_tables
+
 def store_ticket(event_id, code, name, email, cpf, user_id, price, lot):
     """Armazena um ticket no DynamoDB."""
-    table = dynamodb.Table(TICKETS_TABLE)
+    table = get_table(TICKETS_TABLE)
     try:
         table.put_item(
             Item={
@@ -120,29 +365,170 @@ def store_ticket(event_id, code, name, email, cpf, user_id, price, lot):
             ConditionExpression='attribute_not_exists(code)'  # Evita duplicação de tickets
         )
         return True
-    except ClientError as e:
+    except aws.ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
             return False  # Código já existe
         raise
 
+def store_tickets_batch(event_id, quantity, name, email, cpf, user_id, price, lot, code_generator, max_attempts=5, payment_id=None):
+    """Armazena vários tickets de um pedido em transações de até TRANSACT_MAX_ITEMS itens.
+
+    Cada ticket mantém a condição attribute_not_exists(code). Quando uma transação
+    é cancelada, apenas os códigos que colidiram são regenerados antes da nova
+    tentativa. Retorna a lista de códigos gravados, que pode ser menor que
+    `quantity` se as tentativas se esgotarem.
+
+    Com `payment_id`, cada transação também acrescenta os códigos ao registro do
+    pagamento no ledger (que precisa estar em 'processing'), então uma nova tentativa
+    sabe exatamente quantos ingressos já foram emitidos.
+    """
+    client = dynamodb.meta.client
+    stored = []
+    max_chunk = TRANSACT_MAX_ITEMS - 1 if payment_id else TRANSACT_MAX_ITEMS
+
+    while len(stored) < quantity:
+        chunk_size = min(quantity - len(stored), max_chunk)
+        used = set(stored)
+        codes = []
+        while len(codes) < chunk_size:
+            code = code_generator()
+            if code not in used:
+                used.add(code)
+                codes.append(code)
+
+        for _ in range(max_attempts):
+            actions = [
+                {
+                    'Put': {
+                        'TableName': TICKETS_TABLE,
+                        'Item': {
+                            'event_id': event_id,
+                            'code': code,
+                            'name': name,
+                            'email': email,
+                            'cpf': cpf,
+                            'user_id': user_id,
+                            'price': price,
+                            'lot': lot
+                        },
+                        'ConditionExpression': 'attribute_not_exists(code)'  # Evita duplicação de tickets
+                    }
+                }
+                for code in codes
+            ]
+            if payment_id:
+                actions.append({'Update': {
+                    'TableName': PROCESSED_PAYMENTS_TABLE,
+                    'Key': {'payment_id': str(payment_id)},
+                    'UpdateExpression': 'SET codes = list_append(if_not_exists(codes, :empty), :codes)',
+                    'ConditionExpression': '#status = :processing',
+                    'ExpressionAttributeNames': {'#status': 'status'},
+                    'ExpressionAttributeValues': {':empty': [], ':codes': codes, ':processing': 'processing'}
+                }})
+            try:
+                client.transact_write_items(TransactItems=actions)
+                break
+            except aws.ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                reasons = e.response.get('CancellationReasons', [])
+                if any(r.get('Code') not in ('None', 'ConditionalCheckFailed', 'TransactionConflict') for r in reasons):
+                    raise
+                if payment_id and len(reasons) > len(codes) and reasons[len(codes)].get('Code') == 'ConditionalCheckFailed':
+                    raise RuntimeError(f"Pagamento {payment_id} não está mais em processamento")
+                # Regenera somente os códigos que já existem na tabela
+                for i, reason in enumerate(reasons[:len(codes)]):
+                    if reason.get('Code') == 'ConditionalCheckFailed':
+                        code = code_generator()
+                        while code in used:
+                            code = code_generator()
+                        used.add(code)
+                        codes[i] = code
+        else:
+            return stored
+
+        stored.extend(codes)
+
+    return stored
+
 def get_ticket(event_id, code):
     """Recupera um ticket pelo event_id e código."""
-    table = dynamodb.Table(TICKETS_TABLE)
+    table = get_table(TICKETS_TABLE)
     response = table.get_item(Key={'event_id': event_id, 'code': code})
     return response.get('Item')
 
+def encode_cursor(last_evaluated_key):
+    """Converte um LastEvaluatedKey em um cursor opaco para a API."""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, default=lambda d: int(d) if d == d.to_integral_value() else float(d))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor, key_names, **expected):
+    """
+    Converte um cursor da API de volta em ExclusiveStartKey. Lança ValueError se for inválido.
+
+    O cursor precisa ter exatamente os atributos `key_names`, todos strings, e os valores
+    de `expected` (ex.: a chave de partição da consulta).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        key = json.loads(raw, parse_int=Decimal, parse_float=Decimal)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+    if (not isinstance(key, dict) or set(key) != set(key_names)
+            or not all(isinstance(value, str) for value in key.values())
+            or any(key[name] != value for name, value in expected.items())):
+        raise ValueError("Cursor inválido")
+    return key
+
+def iter_all_tickets(event_id, page_size=None, attributes=None):
+    """
+    Percorre os tickets de um evento página a página, sem carregar todos em memória.
+
+    `attributes` restringe os atributos lidos (ProjectionExpression).
+    """
+    table = get_table(TICKETS_TABLE)
+    query_kwargs = {
+        'KeyConditionExpression': 'event_id = :event_id',
+        'ExpressionAttributeValues': {':event_id': event_id}
+    }
+    if page_size:
+        query_kwargs['Limit'] = page_size
+    if attributes:
+        query_kwargs['ProjectionExpression'] = ', '.join(f'#a{i}' for i in range(len(attributes)))
+        query_kwargs['ExpressionAttributeNames'] = {f'#a{i}': name for i, name in enumerate(attributes)}
+
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def get_tickets_page(event_id, limit=100, cursor=None):
+    """Recupera uma página de tickets de um evento e o cursor da próxima página. Lança ValueError se o limite ou o cursor forem inválidos."""
+    if limit < 1:
+        raise ValueError("O limite deve ser maior que zero")
+    table = get_table(TICKETS_TABLE)
+    query_kwargs = {
+        'KeyConditionExpression': 'event_id = :event_id',
+        'ExpressionAttributeValues': {':event_id': event_id},
+        'Limit': limit
+    }
+    if cursor:
+        query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor, ('event_id', 'code'), event_id=event_id)
+
+    response = table.query(**query_kwargs)
+    return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
 def get_all_tickets(event_id):
     """Recupera todos os tickets de um evento."""
-    table = dynamodb.Table(TICKETS_TABLE)
-    response = table.query(
-        KeyConditionExpression='event_id = :event_id',
-        ExpressionAttributeValues={':event_id': event_id}
-    )
-    return response.get('Items', [])
+    return list(iter_all_tickets(event_id))
 
 def update_ticket(event_id, code, name=None, email=None, cpf=None):
     """Atualiza os dados de um ticket."""
-    table = dynamodb.Table(TICKETS_TABLE)
+    table = get_table(TICKETS_TABLE)
     update_expression = []
     expression_attribute_values = {}
 
@@ -173,34 +559,251 @@ def update_ticket(event_id, code, name=None, email=None, cpf=None):
 
 def delete_ticket(event_id, code):
     """Deleta um ticket pelo event_id e código."""
-    table = dynamodb.Table(TICKETS_TABLE)
+    table = get_table(TICKETS_TABLE)
     response = table.delete_item(Key={'event_id': event_id, 'code': code})
     return response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 200
 
-def move_ticket_to_validated(event_id, code):
-    """Move um ticket para a tabela de validados."""
-    tickets_table = dynamodb.Table(TICKETS_TABLE)
-    validated_table = dynamodb.Table(VALIDATED_TICKETS_TABLE)
+def move_ticket_to_validated(event_id, code, max_attempts=3):
+    """
+    Move um ticket para a tabela de validados.
+
+    A inserção em validated_tickets e a remoção de tickets acontecem em uma única
+    transação condicionada à existência do ticket, então dois leitores validando o
+    mesmo código ao mesmo tempo não conseguem ambos validá-lo.
+
+    Retorna False se o ticket não existir ou já tiver sido validado. Conflitos
+    temporários de transação são tentados de novo; se persistirem, o erro é propagado.
+    """
+    tickets_table = get_table(TICKETS_TABLE)
 
     # Recupera o ticket da tabela original
-    ticket = tickets_table.get_item(Key={'event_id': event_id, 'code': code}).get('Item')
-    if ticket:
-        # Insere o ticket na tabela de validados
-        validated_table.put_item(Item=ticket)
-        # Remove o ticket da tabela original
-        tickets_table.delete_item(Key={'event_id': event_id, 'code': code})
+    ticket = tickets_table.get_item(Key={'event_id': event_id, 'code': code}, ConsistentRead=True).get('Item')
+    if not ticket:
+        return False
+
+    for attempt in range(max_attempts):
+        ticket['validated_at'] = int(time.time())
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Put': {
+                    'TableName': VALIDATED_TICKETS_TABLE,
+                    'Item': ticket,
+                    'ConditionExpression': 'attribute_not_exists(code)'
+                }},
+                {'Delete': {
+                    'TableName': TICKETS_TABLE,
+                    'Key': {'event_id': event_id, 'code': code},
+                    'ConditionExpression': 'attribute_exists(code)'
+                }}
+            ])
+            return True
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if 'ConditionalCheckFailed' in reasons:
+                return False  # Validado por outro leitor
+            if any(reason not in ('None', 'TransactionConflict') for reason in reasons) or attempt == max_attempts - 1:
+                raise
+            # Conflito com outra transação sobre o mesmo item; tenta de novo em seguida
+            time.sleep(0.05 * (attempt + 1))
+
+def validate_tickets_batch(event_id, codes, max_attempts=3):
+    """
+    Valida vários códigos de um evento com leituras em lote e movimentações transacionais.
+
+    Retorna um dicionário código -> 'validated', 'already_used', 'unknown' ou 'error'
+    ('error' quando um conflito de transação persistiu; o ingresso continua válido e o
+    leitor deve tentar de novo).
+    """
+    codes = list(dict.fromkeys(codes))
+    keys = [{'event_id': event_id, 'code': code} for code in codes]
+    tickets = {item['code']: item for item in _batch_get(TICKETS_TABLE, keys, consistent_read=True)}
+
+    results = {}
+    missing = [key for key in keys if key['code'] not in tickets]
+    if missing:
+        used = {item['code'] for item in _batch_get(VALIDATED_TICKETS_TABLE, missing)}
+        for key in missing:
+            results[key['code']] = 'already_used' if key['code'] in used else 'unknown'
+
+    # Cada movimentação ocupa duas ações da transação (Put + Delete)
+    pending = [tickets[code] for code in codes if code in tickets]
+    chunk_size = TRANSACT_MAX_ITEMS // 2
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        for _ in range(max_attempts):
+            if not chunk:
+                break
+            validated_at = int(time.time())
+            actions = []
+            for ticket in chunk:
+                actions.append({'Put': {
+                    'TableName': VALIDATED_TICKETS_TABLE,
+                    'Item': dict(ticket, validated_at=validated_at),
+                    'ConditionExpression': 'attribute_not_exists(code)'
+                }})
+                actions.append({'Delete': {
+                    'TableName': TICKETS_TABLE,
+                    'Key': {'event_id': event_id, 'code': ticket['code']},
+                    'ConditionExpression': 'attribute_exists(code)'
+                }})
+            try:
+                dynamodb.meta.client.transact_write_items(TransactItems=actions)
+                results.update({ticket['code']: 'validated' for ticket in chunk})
+                chunk = []
+            except aws.ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                reasons = e.response.get('CancellationReasons', [])
+                # Tickets validados por outro leitor saem do lote; os demais são tentados de novo
+                retry = []
+                for i, ticket in enumerate(chunk):
+                    codes_pair = [reason.get('Code') for reason in reasons[2 * i:2 * i + 2]]
+                    if 'ConditionalCheckFailed' in codes_pair:
+                        results[ticket['code']] = 'already_used'
+                    else:
+                        retry.append(ticket)
+                chunk = retry
+
+        # Conflitos persistentes são resolvidos um a um
+        for ticket in chunk:
+            try:
+                validated = move_ticket_to_validated(event_id, ticket['code'])
+            except aws.ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                results[ticket['code']] = 'error'
+                continue
+            results[ticket['code']] = 'validated' if validated else 'already_used'
+
+    return results
+
+def get_validated_codes_since(event_id, since):
+    """Recupera os códigos do evento validados a partir do timestamp `since`, pelo índice event_id-validated_at."""
+    table = get_table(VALIDATED_TICKETS_TABLE)
+    expression_attribute_values = {':event_id': event_id, ':since': int(since)}
+    try:
+        items = _paginate(
+            table.query,
+            IndexName=VALIDATED_AT_INDEX,
+            KeyConditionExpression='event_id = :event_id AND validated_at >= :since',
+            ExpressionAttributeValues=expression_attribute_values
+        )
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ValidationException':
+            raise
+        # Índice ainda em criação
+        print(f"Índice {VALIDATED_AT_INDEX} indisponível, usando filtro: {e}")
+        items = _paginate(
+            table.query,
+            KeyConditionExpression='event_id = :event_id',
+            FilterExpression='validated_at >= :since',
+            ProjectionExpression='code',
+            ExpressionAttributeValues=expression_attribute_values
+        )
+    return [item['code'] for item in items]
+
+def get_processed_payment(payment_id, consistent_read=False):
+    """Recupera o registro de um pagamento no ledger do webhook."""
+    table = get_table(PROCESSED_PAYMENTS_TABLE)
+    response = table.get_item(Key={'payment_id': str(payment_id)}, ConsistentRead=consistent_read)
+    return response.get('Item')
+
+def claim_payment(payment_id, stale_after=300):
+    """
+    Reserva um pagamento aprovado para emissão de ingressos.
+
+    Retorna False se o pagamento já foi processado ou está sendo processado por
+    outro worker há menos de `stale_after` segundos. Ao retomar um pagamento, o
+    progresso já gravado (códigos emitidos e crédito do saldo) é preservado.
+    """
+    table = get_table(PROCESSED_PAYMENTS_TABLE)
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key={'payment_id': str(payment_id)},
+            UpdateExpression='SET #status = :processing, claimed_at = :now',
+            ConditionExpression='attribute_not_exists(payment_id) OR (#status = :processing AND claimed_at < :stale)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':processing': 'processing', ':now': now, ':stale': now - stale_after}
+        )
         return True
-    return False
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def release_payment_claim(payment_id):
+    """Libera a reserva de um pagamento que falhou, para que a próxima tentativa o retome logo."""
+    table = get_table(PROCESSED_PAYMENTS_TABLE)
+    try:
+        table.update_item(
+            Key={'payment_id': str(payment_id)},
+            UpdateExpression='SET claimed_at = :zero',
+            ConditionExpression='#status = :processing',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':zero': 0, ':processing': 'processing'}
+        )
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def complete_payment(payment_id, status):
+    """Registra o estado final de um pagamento no ledger, mantendo o progresso gravado."""
+    table = get_table(PROCESSED_PAYMENTS_TABLE)
+    table.update_item(
+        Key={'payment_id': str(payment_id)},
+        UpdateExpression='SET #status = :status, processed_at = :now',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={':status': status, ':now': int(time.time())}
+    )
+
+def allocate_ids(counter_name, count=1, seed=None):
+    """
+    Reserva um bloco de `count` IDs consecutivos com um contador atômico (update_item ADD).
+
+    Na primeira utilização o contador é inicializado com o valor retornado por `seed`,
+    para não reutilizar IDs de registros criados antes dele.
+    """
+    table = get_table(COUNTERS_TABLE)
+    for _ in range(2):
+        try:
+            response = table.update_item(
+                Key={'name': counter_name},
+                UpdateExpression='ADD #value :count',
+                ConditionExpression='attribute_exists(#value)',
+                ExpressionAttributeNames={'#value': 'value'},
+                ExpressionAttributeValues={':count': count},
+                ReturnValues='UPDATED_NEW'
+            )
+            last_id = int(response['Attributes']['value'])
+            return range(last_id - count + 1, last_id + 1)
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        # Contador ainda não existe; outro processo pode inicializá-lo ao mesmo tempo
+        try:
+            table.put_item(
+                Item={'name': counter_name, 'value': seed() if seed else 0},
+                ConditionExpression='attribute_not_exists(#value)',
+                ExpressionAttributeNames={'#value': 'value'}
+            )
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    raise RuntimeError(f"Não foi possível inicializar o contador {counter_name}")
+
+def _max_lote_id():
+    """Maior ID de lote existente, usado uma única vez para inicializar o contador."""
+    table = get_table(LOTES_TABLE)
+    items = _paginate(table.scan, ProjectionExpression='#id', ExpressionAttributeNames={'#id': 'id'})
+    return max((int(item['id']) for item in items), default=0)
 
 def adicionar_lote(nome, descricao, valor, quantidade):
     """Adiciona um novo lote."""
-    table = dynamodb.Table(LOTES_TABLE)
-    try:
-        # Gera um ID incremental
-        last_id = max([item['id'] for item in table.scan()['Items']]) if table.scan()['Count'] > 0 else 0
-        new_id = last_id + 1
-    except KeyError:
-        new_id = 1
+    table = get_table(LOTES_TABLE)
+    new_id = allocate_ids(LOTES_TABLE, seed=_max_lote_id)[0]
 
     table.put_item(
         Item={
@@ -209,19 +812,60 @@ def adicionar_lote(nome, descricao, valor, quantidade):
             'descricao': descricao,
             'valor': valor,
             'quantidade': quantidade
-        }
+        },
+        ConditionExpression='attribute_not_exists(id)'  # Nunca sobrescreve um lote existente
     )
+    invalidate_lotes_cache()
     return new_id
 
+def _lotes_stamp():
+    if not LOTES_CACHE_STAMP:
+        return None
+    try:
+        return os.stat(LOTES_CACHE_STAMP).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+def invalidate_lotes_cache():
+    """Descarta a listagem de lotes em cache neste processo e, se configurado, nos demais workers."""
+    _lotes_cache.invalidate()
+    if LOTES_CACHE_STAMP:
+        with open(LOTES_CACHE_STAMP, 'a'):
+            os.utime(LOTES_CACHE_STAMP)
+
 def listar_lotes():
-    """Lista todos os lotes."""
-    table = dynamodb.Table(LOTES_TABLE)
-    response = table.scan()
-    return response.get('Items', [])
+    """Lista todos os lotes, servindo do cache enquanto ele for válido."""
+    stamp = _lotes_stamp()
+    cached = _lotes_cache.get('lotes')
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    # Apenas uma thread por processo recarrega a listagem; as demais reaproveitam o resultado
+    with _lotes_load_lock:
+        cached = _lotes_cache.get('lotes')
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        table = get_table(LOTES_TABLE)
+        lotes = _paginate(table.scan)
+        for lote in lotes:
+            if lote.get('shards'):
+                # Em lotes particionados o estoque disponível fica também nos shards
+                lote['quantidade'] += sum(shard['quantidade'] for shard in get_lote_shards(lote['id']))
+        _lotes_cache.set('lotes', (stamp, lotes))
+        return lotes
+
+def get_lote_shards(lot_id):
+    """Recupera os shards de estoque de um lote particionado."""
+    table = get_table(LOTE_SHARDS_TABLE)
+    return _paginate(
+        table.query,
+        KeyConditionExpression='lot_id = :lot_id',
+        ExpressionAttributeValues={':lot_id': lot_id}
+    )
 
 def editar_lote(id, nome=None, descricao=None, valor=None, quantidade=None):
     """Edita um lote existente no DynamoDB."""
-    table = dynamodb.Table(LOTES_TABLE)
+    table = get_table(LOTES_TABLE)
     update_expression = []
     expression_attribute_values = {}
     expression_attribute_names = {}
@@ -247,13 +891,25 @@ def editar_lote(id, nome=None, descricao=None, valor=None, quantidade=None):
         expression_attribute_names['#quantidade'] = 'quantidade'
 
     if update_expression:
-        response = table.update_item(
-            Key={'id': id},
-            UpdateExpression='SET ' + ', '.join(update_expression),  # Corrigido aqui
-            ExpressionAttributeNames=expression_attribute_names if expression_attribute_names else None,
-            ExpressionAttributeValues=expression_attribute_values,
-            ReturnValues='UPDATED_NEW'
-        )
+        update_kwargs = {}
+        if quantidade is not None:
+            # O estoque de lotes particionados só muda pelos shards
+            update_kwargs['ConditionExpression'] = 'attribute_not_exists(shards) OR shards = :zero'
+            expression_attribute_values[':zero'] = 0
+        try:
+            response = table.update_item(
+                Key={'id': id},
+                UpdateExpression='SET ' + ', '.join(update_expression),  # Corrigido aqui
+                ExpressionAttributeNames=expression_attribute_names if expression_attribute_names else None,
+                ExpressionAttributeValues=expression_attribute_values,
+                ReturnValues='UPDATED_NEW',
+                **update_kwargs
+            )
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        invalidate_lotes_cache()
         return response.get('Attributes') is not None
     
     return False  # Nenhum dado foi atualizado
@@ -261,80 +917,306 @@ def editar_lote(id, nome=None, descricao=None, valor=None, quantidade=None):
 
 def excluir_lote(id):
     """Exclui um lote pelo ID."""
-    table = dynamodb.Table(LOTES_TABLE)
+    table = get_table(LOTES_TABLE)
     response = table.delete_item(Key={'id': id})
+    invalidate_lotes_cache()
     return response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 200
 
 def get_user_tickets(user_id, event_id=None):
-    """Recupera os tickets de um usuário."""
-    table = dynamodb.Table(TICKETS_TABLE)
+    """Recupera os tickets de um usuário pelo índice user_id-event_id, percorrendo todas as páginas."""
+    table = get_table(TICKETS_TABLE)
     if event_id:
-        response = table.scan(
-            FilterExpression='user_id = :user_id AND event_id = :event_id',
-            ExpressionAttributeValues={':user_id': user_id, ':event_id': event_id}
-        )
+        key_condition = 'user_id = :user_id AND event_id = :event_id'
+        expression_attribute_values = {':user_id': user_id, ':event_id': event_id}
     else:
-        response = table.scan(
-            FilterExpression='user_id = :user_id',
-            ExpressionAttributeValues={':user_id': user_id}
+        key_condition = 'user_id = :user_id'
+        expression_attribute_values = {':user_id': user_id}
+
+    query_kwargs = {
+        'IndexName': USER_TICKETS_INDEX,
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeValues': expression_attribute_values
+    }
+    try:
+        return _paginate(table.query, **query_kwargs)
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'ValidationException':
+            raise
+        # Índice ainda em criação
+        print(f"Índice {USER_TICKETS_INDEX} indisponível, usando scan: {e}")
+        return _paginate(
+            table.scan,
+            FilterExpression=key_condition,
+            ExpressionAttributeValues=expression_attribute_values
         )
-    return response.get('Items', [])
+
+def _paginate(operation, **kwargs):
+    """Executa query/scan seguindo LastEvaluatedKey até a última página."""
+    items = []
+    while True:
+        response = operation(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def _balance_shard_key(admin_id, shard):
+    return f'{admin_id}#{shard}'
+
+def _batch_get(table_name, keys, consistent_read=False):
+    """Lê vários itens com BatchGetItem, repetindo as chaves não processadas."""
+    items = []
+    for start in range(0, len(keys), 100):
+        request_items = {table_name: {'Keys': keys[start:start + 100], 'ConsistentRead': consistent_read}}
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys')
+    return items
+
+def get_admin_balance_shards(admin_id, consistent_read=False):
+    """Recupera o item principal e os shards do saldo, indexados pela chave de cada item."""
+    keys = [{'admin_id': admin_id}] + [
+        {'admin_id': _balance_shard_key(admin_id, shard)} for shard in range(ADMIN_BALANCE_SHARDS)
+    ]
+    items = _batch_get('admin_balance', keys, consistent_read)
+    return {item['admin_id']: item.get('balance', Decimal('0')) for item in items}
 
 def get_admin_balance(admin_id):
-    """Recupera o saldo do administrador."""
-    table = dynamodb.Table('admin_balance')
-    response = table.get_item(Key={'admin_id': admin_id})
-    if 'Item' in response:
-        return response['Item'].get('balance', Decimal('0'))
-    return Decimal('0')
+    """Recupera o saldo do administrador somando o item principal e os shards."""
+    return sum(get_admin_balance_shards(admin_id).values(), Decimal('0'))
 
 def update_admin_balance(admin_id, amount):
-    """Atualiza o saldo do administrador."""
-    table = dynamodb.Table('admin_balance')
+    """Atualiza o saldo do administrador em um shard escolhido aleatoriamente."""
+    table = get_table('admin_balance')
+    shard_key = _balance_shard_key(admin_id, random.randrange(ADMIN_BALANCE_SHARDS))
     try:
         table.update_item(
-            Key={'admin_id': admin_id},
+            Key={'admin_id': shard_key},
             UpdateExpression='SET balance = if_not_exists(balance, :zero) + :amount',
             ExpressionAttributeValues={':amount': Decimal(str(amount)), ':zero': Decimal('0')},
             ReturnValues='UPDATED_NEW'
         )
         return True
-    except ClientError as e:
+    except aws.ClientError as e:
         print(f"Erro ao atualizar saldo: {e}")
         return False
 
-def add_withdrawal_request(admin_id, amount):
-    """Adiciona uma solicitação de saque."""
-    table = dynamodb.Table('admin_balance')
+def credit_payment_balance(admin_id, payment_id, amount):
+    """
+    Credita o valor de um pagamento no saldo do administrador uma única vez.
+
+    O crédito e a marcação `credited` no ledger são gravados na mesma transação.
+    Retorna False se o pagamento já tinha sido creditado.
+    """
+    shard_key = _balance_shard_key(admin_id, random.randrange(ADMIN_BALANCE_SHARDS))
     try:
-        table.update_item(
-            Key={'admin_id': admin_id},
-            UpdateExpression='SET withdrawal_requests = list_append(if_not_exists(withdrawal_requests, :empty_list), :request)',
-            ExpressionAttributeValues={
-                ':request': [{'amount': Decimal(str(amount)), 'status': 'pending'}],
-                ':empty_list': []
-            },
-            ReturnValues='UPDATED_NEW'
-        )
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': PROCESSED_PAYMENTS_TABLE,
+                'Key': {'payment_id': str(payment_id)},
+                'UpdateExpression': 'SET credited = :true',
+                'ConditionExpression': '#status = :processing AND attribute_not_exists(credited)',
+                'ExpressionAttributeNames': {'#status': 'status'},
+                'ExpressionAttributeValues': {':true': True, ':processing': 'processing'}
+            }},
+            {'Update': {
+                'TableName': 'admin_balance',
+                'Key': {'admin_id': shard_key},
+                'UpdateExpression': 'SET balance = if_not_exists(balance, :zero) + :amount',
+                'ExpressionAttributeValues': {':amount': Decimal(str(amount)), ':zero': Decimal('0')}
+            }}
+        ])
         return True
-    except ClientError as e:
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+        if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+            return False
+        raise
+
+def compact_admin_balance(admin_id):
+    """
+    Transfere o saldo acumulado nos shards para o item principal.
+
+    Cada transferência debita o shard e credita o item principal na mesma transação,
+    então créditos concorrentes continuam corretos. Retorna o valor transferido.
+    """
+    moved = Decimal('0')
+    for key, balance in get_admin_balance_shards(admin_id, consistent_read=True).items():
+        if key == admin_id or balance == 0:
+            continue
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': 'admin_balance',
+                'Key': {'admin_id': key},
+                'UpdateExpression': 'SET balance = balance - :amount',
+                'ExpressionAttributeValues': {':amount': balance}
+            }},
+            {'Update': {
+                'TableName': 'admin_balance',
+                'Key': {'admin_id': admin_id},
+                'UpdateExpression': 'SET balance = if_not_exists(balance, :zero) + :amount',
+                'ExpressionAttributeValues': {':amount': balance, ':zero': Decimal('0')}
+            }}
+        ])
+        moved += balance
+    return moved
+
+def check_admin_balance(admin_id):
+    """
+    Confere o saldo contra as vendas registradas: soma dos preços dos tickets
+    (emitidos e validados) menos os saques solicitados.
+
+    Lê as tabelas de tickets inteiras; use apenas em jobs de conciliação.
+    """
+    shards = get_admin_balance_shards(admin_id, consistent_read=True)
+    balance = sum(shards.values(), Decimal('0'))
+
+    sales = Decimal('0')
+    for table_name in (TICKETS_TABLE, VALIDATED_TICKETS_TABLE):
+        table = get_table(table_name)
+        items = _paginate(table.scan, ProjectionExpression='price')
+        sales += sum((item.get('price', Decimal('0')) for item in items), Decimal('0'))
+
+    item = get_table('admin_balance').get_item(Key={'admin_id': admin_id}, ConsistentRead=True).get('Item', {})
+    ledger = _paginate(
+        get_table(WITHDRAWALS_TABLE).query,
+        KeyConditionExpression='admin_id = :admin_id',
+        ExpressionAttributeValues={':admin_id': admin_id},
+        ProjectionExpression='amount'
+    )
+    withdrawals = sum(
+        (Decimal(str(w['amount'])) for w in item.get('withdrawal_requests', []) + ledger), Decimal('0')
+    )
+
+    expected = sales - withdrawals
+    return {
+        'balance': balance,
+        'shards': shards,
+        'sales': sales,
+        'withdrawals': withdrawals,
+        'expected': expected,
+        'consistent': balance == expected
+    }
+
+def parse_amount(value):
+    """Converte um valor recebido pela API em Decimal finito e positivo. Lança ValueError se for inválido."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise ValueError("Valor inválido")
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError("Valor inválido")
+    if not amount.is_finite():
+        raise ValueError("Valor inválido")
+    if amount <= 0:
+        raise ValueError("O valor deve ser maior que zero")
+    return amount
+
+def add_withdrawal_request(admin_id, amount):
+    """
+    Registra uma solicitação de saque e debita o saldo na mesma transação.
+
+    O saldo dos shards é compactado antes, para que a condição balance >= amount no item
+    principal considere todas as vendas. Retorna o ID do saque, None se o saldo for
+    insuficiente ou False em caso de erro. Lança ValueError se o valor não for positivo.
+    """
+    amount = parse_amount(amount)
+    now = datetime.now(timezone.utc).isoformat(timespec='microseconds')
+    withdrawal_id = f'{now}#{uuid.uuid4().hex[:8]}'
+    try:
+        compact_admin_balance(admin_id)
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Put': {
+                'TableName': WITHDRAWALS_TABLE,
+                'Item': {
+                    'admin_id': admin_id,
+                    'withdrawal_id': withdrawal_id,
+                    'amount': amount,
+                    'status': 'pending',
+                    'requested_at': now
+                },
+                'ConditionExpression': 'attribute_not_exists(withdrawal_id)'
+            }},
+            {'Update': {
+                'TableName': 'admin_balance',
+                'Key': {'admin_id': admin_id},
+                'UpdateExpression': 'SET balance = balance - :amount',
+                'ConditionExpression': 'balance >= :amount AND :amount > :zero',
+                'ExpressionAttributeValues': {':amount': amount, ':zero': Decimal('0')}
+            }}
+        ])
+        return withdrawal_id
+    except aws.ClientError as e:
+        reasons = e.response.get('CancellationReasons', [])
+        if len(reasons) == 2 and reasons[1].get('Code') == 'ConditionalCheckFailed':
+            return None  # Saldo insuficiente
         print(f"Erro ao adicionar solicitação de saque: {e}")
         return False
 
-def mark_withdrawal_as_done(admin_id, index):
-    """Marca um saque como realizado."""
-    table = dynamodb.Table('admin_balance')
+def list_withdrawals(admin_id, limit=50, cursor=None):
+    """Lista os saques do administrador, do mais recente para o mais antigo, com paginação por cursor."""
+    table = get_table(WITHDRAWALS_TABLE)
+    query_kwargs = {
+        'KeyConditionExpression': 'admin_id = :admin_id',
+        'ExpressionAttributeValues': {':admin_id': admin_id},
+        'ScanIndexForward': False,
+        'Limit': limit
+    }
+    if cursor:
+        query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor, ('admin_id', 'withdrawal_id'), admin_id=admin_id)
+
+    response = table.query(**query_kwargs)
+    return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
+def mark_withdrawal_as_done(admin_id, withdrawal_id):
+    """Marca um saque como realizado. Retorna False se o saque não existir."""
+    table = get_table(WITHDRAWALS_TABLE)
     try:
         table.update_item(
-            Key={'admin_id': admin_id},
-            UpdateExpression=f'SET withdrawal_requests[{index}].#status = :done',
+            Key={'admin_id': admin_id, 'withdrawal_id': withdrawal_id},
+            UpdateExpression='SET #status = :done, done_at = :now',
+            ConditionExpression='attribute_exists(withdrawal_id)',
             ExpressionAttributeNames={
                 '#status': 'status'  # Mapeia a palavra reservada "status" para um alias
             },
-            ExpressionAttributeValues={':done': 'done'},
+            ExpressionAttributeValues={':done': 'done', ':now': datetime.now(timezone.utc).isoformat()},
             ReturnValues='UPDATED_NEW'
         )
         return True
-    except ClientError as e:
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False  # Saque não encontrado
         print(f"Erro ao marcar saque como realizado: {e}")
-        return False
+        raise
+
+def migrate_legacy_withdrawals(admin_id):
+    """
+    Copia os saques da lista withdrawal_requests do item de saldo para o ledger e remove a lista.
+
+    Os IDs gerados ('0000-legacy-NNNNNN') ficam antes de qualquer saque novo na ordenação.
+    """
+    balance_table = get_table('admin_balance')
+    item = balance_table.get_item(Key={'admin_id': admin_id}, ConsistentRead=True).get('Item', {})
+    legacy = item.get('withdrawal_requests', [])
+    if not legacy:
+        return 0
+
+    with get_table(WITHDRAWALS_TABLE).batch_writer() as batch:
+        for index, request in enumerate(legacy):
+            batch.put_item(Item={
+                'admin_id': admin_id,
+                'withdrawal_id': f'0000-legacy-{index:06d}',
+                'amount': Decimal(str(request['amount'])),
+                'status': request.get('status', 'pending')
+            })
+
+    balance_table.update_item(
+        Key={'admin_id': admin_id},
+        UpdateExpression='REMOVE withdrawal_requests',
+        ConditionExpression='size(withdrawal_requests) = :count',
+        ExpressionAttributeValues={':count': len(legacy)}
+    )
+    return len(legacy)
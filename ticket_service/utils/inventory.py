@@ -0,0 +1,339 @@
+import os
+import random
+import threading
+import time
+import uuid
+from shared import aws
+from shared.aws import get_table
+from ticket_service.utils.db import (
+    dynamodb, _paginate, LOTES_TABLE, RESERVATIONS_TABLE, LOTE_SHARDS_TABLE,
+    RESERVATIONS_EXPIRY_INDEX, TRANSACT_MAX_ITEMS, listar_lotes, get_lote_shards, invalidate_lotes_cache
+)
+
+# Tempo que os ingressos ficam reservados aguardando a confirmação do pagamento
+RESERVATION_TTL = int(os.environ.get('RESERVATION_TTL', 1800))
+RESERVATION_SWEEP_INTERVAL = int(os.environ.get('RESERVATION_SWEEP_INTERVAL', 60))
+
+# Tentativas das operações que envolvem vários shards antes de desistir
+SHARD_TRANSACTION_ATTEMPTS = 5
+
+_sweeper = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+def resolve_lot_id(lot):
+    """Converte o lote informado pelo frontend (ID ou nome) no ID numérico do lote."""
+    for lote in listar_lotes():
+        if str(lote['id']) == str(lot) or lote.get('nome') == lot:
+            return int(lote['id'])
+    return None
+
+def _lot_shards(lot_id, fresh=False):
+    """Número de shards do lote (0 quando o estoque fica no próprio item do lote)."""
+    if fresh:
+        item = get_table(LOTES_TABLE).get_item(
+            Key={'id': lot_id}, ProjectionExpression='shards', ConsistentRead=True
+        ).get('Item', {})
+        return int(item.get('shards', 0))
+    for lote in listar_lotes():
+        if int(lote['id']) == lot_id:
+            return int(lote.get('shards', 0))
+    return 0
+
+def _decrement(table_name, key, quantity):
+    """Baixa `quantity` unidades do estoque se houver saldo suficiente."""
+    try:
+        get_table(table_name).update_item(
+            Key=key,
+            UpdateExpression='SET quantidade = quantidade - :n',
+            ConditionExpression='quantidade >= :n',
+            ExpressionAttributeValues={':n': quantity}
+        )
+        return True
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def _take_stock_across_shards(lot_id, quantity):
+    """
+    Baixa `quantity` unidades somando o saldo de vários shards e do item do lote em uma transação.
+
+    Usada quando nenhum item sozinho tem estoque suficiente. Cada baixa mantém a condição
+    quantidade >= n; se algum item mudar nesse meio tempo, os saldos são lidos de novo.
+    """
+    for _ in range(SHARD_TRANSACTION_ATTEMPTS):
+        sources = [
+            (LOTE_SHARDS_TABLE, {'lot_id': lot_id, 'shard': shard['shard']}, int(shard['quantidade']))
+            for shard in get_lote_shards(lot_id)
+        ]
+        lote = get_table(LOTES_TABLE).get_item(Key={'id': lot_id}, ConsistentRead=True).get('Item', {})
+        sources.append((LOTES_TABLE, {'id': lot_id}, int(lote.get('quantidade', 0))))
+
+        # Os itens com mais estoque primeiro, para envolver o menor número de chaves
+        actions, remaining = [], quantity
+        for table_name, key, available in sorted(sources, key=lambda source: -source[2]):
+            if remaining == 0:
+                break
+            if available <= 0:
+                continue
+            taken = min(available, remaining)
+            actions.append({'Update': {
+                'TableName': table_name,
+                'Key': key,
+                'UpdateExpression': 'SET quantidade = quantidade - :n',
+                'ConditionExpression': 'quantidade >= :n',
+                'ExpressionAttributeValues': {':n': taken}
+            }})
+            remaining -= taken
+        if remaining:
+            return False
+
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=actions)
+            return True
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+    return False
+
+def _take_stock(lot_id, quantity):
+    """
+    Baixa o estoque do lote, usando os shards quando o lote for particionado.
+
+    Os shards são tentados a partir de uma posição aleatória, espalhando as escritas
+    concorrentes por várias chaves; o item do lote, que recebe as devoluções de
+    reservas liberadas, é a última opção. Se nenhum item sozinho tiver estoque
+    suficiente, a baixa é dividida entre vários deles. Retorna False se não houver estoque.
+    """
+    shards = _lot_shards(lot_id)
+    for attempt in range(2):
+        if shards:
+            start = random.randrange(shards)
+            for offset in range(shards):
+                shard = (start + offset) % shards
+                if _decrement(LOTE_SHARDS_TABLE, {'lot_id': lot_id, 'shard': shard}, quantity):
+                    return True
+        if _decrement(LOTES_TABLE, {'id': lot_id}, quantity):
+            return True
+        if attempt == 0:
+            # A listagem em cache pode estar desatualizada em relação ao particionamento
+            fresh_shards = _lot_shards(lot_id, fresh=True)
+            if fresh_shards == shards:
+                break
+            shards = fresh_shards
+    return bool(shards) and _take_stock_across_shards(lot_id, quantity)
+
+def _restock_update(lot_id, quantity):
+    """Ação de TransactWriteItems que devolve unidades ao item do lote."""
+    return {'Update': {
+        'TableName': LOTES_TABLE,
+        'Key': {'id': lot_id},
+        'UpdateExpression': 'ADD quantidade :n',
+        'ExpressionAttributeValues': {':n': quantity}
+    }}
+
+def reserve_lot(lot_id, quantity, ttl=RESERVATION_TTL, reservation_id=None):
+    """
+    Reserva `quantity` ingressos do lote com baixa condicional (quantidade >= n).
+
+    Com `reservation_id` (ex.: derivado do pagamento), a reserva é idempotente: se ela já
+    existir, o ID é retornado sem baixar o estoque de novo.
+    Retorna o ID da reserva, ou None se o lote não tiver estoque suficiente.
+    """
+    table = get_table(RESERVATIONS_TABLE)
+    if reservation_id and table.get_item(Key={'reservation_id': reservation_id}, ConsistentRead=True).get('Item'):
+        return reservation_id
+
+    if not _take_stock(lot_id, quantity):
+        return None
+
+    reservation_id = reservation_id or str(uuid.uuid4())
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                'reservation_id': reservation_id,
+                'lot_id': lot_id,
+                'quantity': quantity,
+                'status': 'held',
+                'created_at': now,
+                'expires_at': now + ttl
+            },
+            ConditionExpression='attribute_not_exists(reservation_id)'
+        )
+    except aws.ClientError as e:
+        # Devolve o estoque se a reserva não puder ser registrada
+        get_table(LOTES_TABLE).update_item(
+            Key={'id': lot_id},
+            UpdateExpression='ADD quantidade :n',
+            ExpressionAttributeValues={':n': quantity}
+        )
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return reservation_id  # Criada por outra chamada ao mesmo tempo
+        raise
+    invalidate_lotes_cache()
+    return reservation_id
+
+def confirm_reservation(reservation_id):
+    """
+    Confirma uma reserva após a aprovação do pagamento.
+
+    Confirmar de novo uma reserva já confirmada não tem efeito. Retorna False se a
+    reserva não existir ou já tiver sido liberada.
+    """
+    try:
+        get_table(RESERVATIONS_TABLE).update_item(
+            Key={'reservation_id': reservation_id},
+            UpdateExpression='SET #status = :confirmed REMOVE expires_at',
+            ConditionExpression='#status IN (:held, :confirmed)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':confirmed': 'confirmed', ':held': 'held'}
+        )
+        return True
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def release_reservation(reservation_id):
+    """
+    Libera uma reserva ativa e devolve os ingressos ao estoque na mesma transação.
+
+    Retorna False se a reserva não existir ou já tiver sido confirmada ou liberada.
+    """
+    table = get_table(RESERVATIONS_TABLE)
+    reservation = table.get_item(Key={'reservation_id': reservation_id}, ConsistentRead=True).get('Item')
+    if not reservation or reservation['status'] != 'held':
+        return False
+
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': RESERVATIONS_TABLE,
+                'Key': {'reservation_id': reservation_id},
+                'UpdateExpression': 'SET #status = :released REMOVE expires_at',
+                'ConditionExpression': '#status = :held',
+                'ExpressionAttributeNames': {'#status': 'status'},
+                'ExpressionAttributeValues': {':released': 'released', ':held': 'held'}
+            }},
+            _restock_update(int(reservation['lot_id']), reservation['quantity'])
+        ])
+    except aws.ClientError as e:
+        if e.response['Error']['Code'] == 'TransactionCanceledException':
+            return False
+        raise
+    invalidate_lotes_cache()
+    return True
+
+def release_expired_reservations():
+    """Libera as reservas cujo prazo venceu sem confirmação de pagamento."""
+    table = get_table(RESERVATIONS_TABLE)
+    expired = _paginate(
+        table.query,
+        IndexName=RESERVATIONS_EXPIRY_INDEX,
+        KeyConditionExpression='#status = :held AND expires_at < :now',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={':held': 'held', ':now': int(time.time())}
+    )
+    return sum(1 for item in expired if release_reservation(item['reservation_id']))
+
+def _sweeper_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            released = release_expired_reservations()
+            if released:
+                print(f"{released} reservas expiradas liberadas")
+        except Exception as e:
+            print(f"Erro ao liberar reservas expiradas: {e}")
+
+def start_reservation_sweeper(interval=RESERVATION_SWEEP_INTERVAL):
+    """Inicia a thread que libera periodicamente as reservas expiradas (uma por processo, inclusive após fork)."""
+    global _sweeper, _sweeper_pid
+    if _sweeper_pid == os.getpid():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid != os.getpid():
+            _sweeper_pid = os.getpid()
+            _sweeper = threading.Thread(target=_sweeper_loop, args=(interval,), name='reservation-sweeper', daemon=True)
+            _sweeper.start()
+
+def enable_lot_sharding(lot_id, shards):
+    """
+    Distribui o estoque de um lote entre `shards` itens para suportar vendas muito disputadas.
+
+    Com `shards` igual a 0 o estoque volta para o próprio item do lote. Reservas liberadas
+    devolvem os ingressos ao item do lote, que continua disponível para novas reservas.
+    """
+    if shards < 0 or shards >= TRANSACT_MAX_ITEMS:
+        raise ValueError(f"O número de shards deve estar entre 0 e {TRANSACT_MAX_ITEMS - 1}")
+
+    lotes_table = get_table(LOTES_TABLE)
+    lote = lotes_table.get_item(Key={'id': lot_id}, ConsistentRead=True).get('Item')
+    if not lote:
+        return False
+
+    if int(lote.get('shards', 0)):
+        _merge_lot_shards(lot_id)
+        lote = lotes_table.get_item(Key={'id': lot_id}, ConsistentRead=True)['Item']
+
+    if shards:
+        quantidade = int(lote['quantidade'])
+        base, extra = divmod(quantidade, shards)
+        actions = [
+            {'Put': {
+                'TableName': LOTE_SHARDS_TABLE,
+                'Item': {'lot_id': lot_id, 'shard': shard, 'quantidade': base + (1 if shard < extra else 0)}
+            }}
+            for shard in range(shards)
+        ]
+        # Move o estoque do lote para os shards somente se ele não mudou desde a leitura
+        actions.append({'Update': {
+            'TableName': LOTES_TABLE,
+            'Key': {'id': lot_id},
+            'UpdateExpression': 'SET quantidade = :zero, shards = :shards',
+            'ConditionExpression': 'quantidade = :quantidade',
+            'ExpressionAttributeValues': {':zero': 0, ':shards': shards, ':quantidade': quantidade}
+        }})
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=actions)
+        except aws.ClientError as e:
+            if e.response['Error']['Code'] == 'TransactionCanceledException':
+                return False
+            raise
+
+    invalidate_lotes_cache()
+    return True
+
+def _merge_lot_shards(lot_id):
+    """Devolve o estoque de cada shard ao item do lote e desativa o particionamento."""
+    for _ in range(SHARD_TRANSACTION_ATTEMPTS):
+        changed = False
+        for shard in get_lote_shards(lot_id):
+            quantidade = shard['quantidade']
+            try:
+                dynamodb.meta.client.transact_write_items(TransactItems=[
+                    {'Delete': {
+                        'TableName': LOTE_SHARDS_TABLE,
+                        'Key': {'lot_id': lot_id, 'shard': shard['shard']},
+                        'ConditionExpression': 'quantidade = :quantidade',
+                        'ExpressionAttributeValues': {':quantidade': quantidade}
+                    }},
+                    _restock_update(lot_id, quantidade)
+                ])
+            except aws.ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise
+                # O shard mudou durante a fusão; é lido de novo na próxima rodada
+                changed = True
+        if not changed:
+            break
+    else:
+        raise RuntimeError(f"Não foi possível unificar os shards do lote {lot_id}, tente novamente")
+
+    get_table(LOTES_TABLE).update_item(
+        Key={'id': lot_id},
+        UpdateExpression='SET shards = :zero',
+        ExpressionAttributeValues={':zero': 0}
+    )